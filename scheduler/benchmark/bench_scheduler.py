@@ -0,0 +1,233 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+Benchmarks of the scheduler hot path on synthetic workloads.
+
+Each run builds `nb_tasks` tasks with mixed delays and priorities,
+a fraction of them disabled, registers them in a scheduler and
+evaluates a number of cycles through `Scheduler.run`, `Scheduler.run_n`
+and `Loop.step`. Results are printed as one JSON object per line.
+
+:Example:
+
+    python bench_scheduler.py --sizes 100 10000 --backends heap wheel
+    python bench_scheduler.py --sizes 1000000 --work noop -o results.json
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id$ "
+
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from random import Random
+from time import perf_counter
+
+from openalea.scheduler import Task,Scheduler,Loop
+
+DELAYS = (1,1,1,2,3,5,10,50)
+PRIORITIES = (0,1,2,3)
+
+def noop () :
+    pass
+
+def cpu_bound (n = 200) :
+    s = 0
+    for i in range(n) :
+        s += i * i
+    return s
+
+WORKS = {"noop":noop,"cpu":cpu_bound}
+
+def create_tasks (nb_tasks, work, disabled, seed = 0) :
+    """Create tasks with mixed delays and priorities.
+
+    nb_tasks: number of tasks
+    work: function called by each task
+    disabled: fraction of tasks whose evaluation is disabled
+    return: list of (task,start_time)
+    """
+    rd = Random(seed)
+    tasks = []
+    for i in range(nb_tasks) :
+        delay = rd.choice(DELAYS)
+        task = Task(work,delay,rd.choice(PRIORITIES),"t%d" % i)
+        if rd.random() < disabled :
+            task.enable_evaluation(False)
+        tasks.append( (task,rd.randrange(delay) ) )
+    return tasks
+
+def create_scheduler (backend, tasks) :
+    sch = Scheduler(backend)
+    for task,start in tasks :
+        sch.register(task,start)
+    return sch
+
+def measure_memory (nb_tasks, work, disabled, backend) :
+    """Memory in bytes per task, tasks and queue included.
+    """
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    sch = create_scheduler(backend,create_tasks(nb_tasks,work,disabled) )
+    mem = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del sch
+    return mem / float(nb_tasks)
+
+def bench_one (backend, nb_tasks, work_name, disabled, nb_steps) :
+    """Run all measures for a single configuration.
+
+    return: dict of results
+    """
+    work = WORKS[work_name]
+    res = {"backend":backend,
+           "nb_tasks":nb_tasks,
+           "work":work_name,
+           "disabled":disabled,
+           "steps":nb_steps}
+
+    tasks = create_tasks(nb_tasks,work,disabled)
+
+    #register
+    t = perf_counter()
+    sch = create_scheduler(backend,tasks)
+    res["register_s"] = perf_counter() - t
+
+    t = perf_counter()
+    Scheduler(backend).register_many([task for task,start in tasks],
+                                     [start for task,start in tasks])
+    res["register_many_s"] = perf_counter() - t
+
+    #run generator
+    g = sch.run()
+    t = perf_counter()
+    for i in range(nb_steps) :
+        next(g)
+    dt = perf_counter() - t
+    res["run_cycles_per_s"] = nb_steps / dt
+    res["run_tasks_per_s"] = nb_steps * nb_tasks * evaluation_rate() / dt
+
+    #batch evaluation
+    sch = create_scheduler(backend,tasks)
+    t = perf_counter()
+    sch.run_n(nb_steps)
+    res["run_n_cycles_per_s"] = nb_steps / (perf_counter() - t)
+
+    #loop in the current thread
+    loop = Loop(create_scheduler(backend,tasks) )
+    t = perf_counter()
+    for i in range(nb_steps) :
+        loop.step()
+    res["loop_step_cycles_per_s"] = nb_steps / (perf_counter() - t)
+
+    res["memory_per_task_bytes"] = measure_memory(nb_tasks,work,
+                                                  disabled,backend)
+
+    return res
+
+def evaluation_rate () :
+    """Mean number of evaluations of a task per cycle.
+    """
+    return sum(1. / d for d in DELAYS) / len(DELAYS)
+
+RATES = ("run_cycles_per_s","run_n_cycles_per_s","loop_step_cycles_per_s")
+CONFIG = ("backend","nb_tasks","work","disabled","steps")
+
+def compare (results, reference, tolerance) :
+    """Find measures slower than a reference.
+
+    results: list of dict returned by bench_one
+    reference: list of dict read from a previous output
+    tolerance: accepted relative slow down (0.2 for 20%)
+    return: list of (config,measure,reference value,new value)
+    """
+    ref = dict( (tuple(res[key] for key in CONFIG),res) for res in reference)
+    regressions = []
+    for res in results :
+        config = tuple(res[key] for key in CONFIG)
+        if config not in ref :
+            continue
+        for measure in RATES :
+            if res[measure] < ref[config][measure] * (1. - tolerance) :
+                regressions.append( (config,measure,
+                                     ref[config][measure],res[measure]) )
+    return regressions
+
+def main (argv = None) :
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--sizes",type = int,nargs = "+",
+                        default = [100,1000,10000,100000],
+                        help = "number of tasks (default: 1e2 to 1e5)")
+    parser.add_argument("--backends",nargs = "+",
+                        default = sorted(Scheduler.backends),
+                        choices = sorted(Scheduler.backends) )
+    parser.add_argument("--work",nargs = "+",default = ["noop","cpu"],
+                        choices = sorted(WORKS) )
+    parser.add_argument("--disabled",type = float,nargs = "+",
+                        default = [0.,0.5],
+                        help = "fraction of disabled tasks")
+    parser.add_argument("--steps",type = int,default = 100,
+                        help = "maximum number of cycles per measure")
+    parser.add_argument("--max-evaluations",type = int,default = 10 ** 6,
+                        help = "limit steps so that steps * tasks stays "
+                               "below this value")
+    parser.add_argument("-o","--output",default = None,
+                        help = "write results in this file (JSON lines)")
+    parser.add_argument("--compare",default = None,
+                        help = "previous output used as reference, exit "
+                               "with status 1 if a measure is slower")
+    parser.add_argument("--tolerance",type = float,default = 0.2,
+                        help = "accepted relative slow down (default 0.2)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output is None else open(args.output,'w')
+    env = {"python":platform.python_version(),
+           "machine":platform.machine()}
+    results = []
+    try :
+        for nb_tasks in args.sizes :
+            nb_steps = max(1,min(args.steps,
+                                 args.max_evaluations // nb_tasks) )
+            for backend in args.backends :
+                for work in args.work :
+                    for disabled in args.disabled :
+                        res = bench_one(backend,nb_tasks,work,
+                                        disabled,nb_steps)
+                        res.update(env)
+                        results.append(res)
+                        out.write(json.dumps(res) + "\n")
+                        out.flush()
+    finally :
+        if out is not sys.stdout :
+            out.close()
+
+    if args.compare is not None :
+        with open(args.compare) as f :
+            reference = [json.loads(line) for line in f if line.strip()]
+        regressions = compare(results,reference,args.tolerance)
+        for config,measure,ref_val,val in regressions :
+            sys.stderr.write("regression %s %s: %.1f -> %.1f\n" % \
+                             (config,measure,ref_val,val) )
+        if len(regressions) > 0 :
+            return 1
+
+    return 0
+
+if __name__ == "__main__" :
+    sys.exit(main() )
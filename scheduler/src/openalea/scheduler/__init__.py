@@ -1,4 +1,6 @@
-from task import Task
-from scheduler import Scheduler
-from loop import Loop
+from .task import Task
+from .scheduler import Scheduler,save_snapshot,load_snapshot
+from .asyncscheduler import AsyncScheduler
+from .loop import Loop,FreeRun,FixedRate,RealTime
+from .profiler import Profiler
 
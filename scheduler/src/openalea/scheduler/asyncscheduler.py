@@ -0,0 +1,249 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+This module defines an AsyncScheduler that evaluates tasks
+using coroutine functions inside an asyncio event loop.
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id$ "
+
+import asyncio
+from inspect import iscoroutinefunction,isawaitable
+from time import perf_counter
+from .task import Task
+from .scheduler import (Scheduler,evaluate_task,has_dependencies,
+                        explicit_predecessors,dependency_graph)
+
+def is_async (func) :
+    """Tell wether func is a coroutine function or an object
+    with an async __call__.
+    """
+    return iscoroutinefunction(func) \
+           or iscoroutinefunction(getattr(func,"__call__",None) )
+
+def calls_func (task) :
+    """Tell wether evaluating task only calls its function,
+    i.e. Task.evaluate is not overriden.
+    """
+    return getattr(type(task),"evaluate",None) is Task.evaluate
+
+class AsyncScheduler (Scheduler) :
+    """Scheduler whose tasks may use coroutine functions.
+
+    Tasks of the same cycle and priority are awaited concurrently
+    with asyncio.gather. Tasks with a regular function are evaluated
+    unchanged, in the event loop thread or in the executor of the
+    scheduler if one is set.
+
+    In a cycle holding tasks with dependencies, each task is awaited
+    as soon as the tasks it depends on are finished.
+
+    Inside an event loop, use `arun` instead of `run`::
+
+        async for cycle in scheduler.arun() :
+            ...
+
+    The synchronous `run`, `run_n` and `run_until` (and Loop) can be
+    used from a thread without running event loop: each cycle is then
+    evaluated in a private event loop, freed by `close`.
+    """
+    def __init__ (self, backend = "heap", executor = None) :
+        Scheduler.__init__(self,backend,executor)
+        self._event_loop = None
+
+    async def _aevaluate (self, task) :
+        """Evaluate a single task.
+
+        return: the delay returned by the task
+        """
+        profiler = self._profiler
+        if profiler is not None :
+            t = perf_counter()
+
+        func = task.func()
+        if is_async(func) or (self._executor is None
+                              and calls_func(task) ) :
+            #the result of any function may be awaitable
+            if task.evaluation_enabled() :
+                result = func()
+                if isawaitable(result) :
+                    await result
+            delay = task.delay()
+        elif self._executor is not None :
+            loop = asyncio.get_running_loop()
+            delay = await loop.run_in_executor(self._executor,
+                                               evaluate_task,task)
+        else :
+            delay = task.evaluate()
+
+        if profiler is not None :
+            profiler.record_task(task,perf_counter() - t)
+
+        return delay
+
+    async def _aevaluate_cycle (self) :
+        """Evaluate all tasks of the next cycle.
+
+        The queue must not be empty.
+        """
+        tasks = self._tasks
+        self._current_cycle,groups = tasks.pop_cycle()
+
+        profiler = self._profiler
+        if profiler is not None :
+            cycle_start = perf_counter()
+
+        if self._use_dependencies :
+            task_list = [task for priority,group in groups for task in group]
+            if any(has_dependencies(task) for task in task_list) :
+                explicit = explicit_predecessors(task_list)
+            else :
+                explicit = ()
+            #graph mode only if some dependencies are resolved
+            if any(len(pred) > 0 for pred in explicit) :
+                await self._aevaluate_graph(task_list,
+                                     [len(group) for priority,group in groups],
+                                     explicit)
+                if profiler is not None :
+                    profiler.record_cycle(self._current_cycle,
+                                          perf_counter() - cycle_start,
+                                          len(task_list) )
+                return
+
+        nb_tasks = 0
+        for priority,task_list in groups :
+            if len(task_list) == 1 :
+                delays = [await self._aevaluate(task_list[0])]
+            else :
+                delays = await asyncio.gather(*[self._aevaluate(task) \
+                                                for task in task_list])
+
+            #reinsert tasks in the group order
+            for task,delay in zip(task_list,delays) :
+                if delay is not None :
+                    tasks.push(self._current_cycle + delay,task)
+
+            nb_tasks += len(task_list)
+
+        if profiler is not None :
+            profiler.record_cycle(self._current_cycle,
+                                  perf_counter() - cycle_start,
+                                  nb_tasks)
+
+    async def _aevaluate_graph (self, task_list, group_sizes = None,
+                                predecessors = None) :
+        """Evaluate the tasks of a cycle according to their dependencies.
+
+        task_list: tasks of the current cycle in their serial
+                   evaluation order
+        group_sizes, predecessors: see `dependency_graph`
+        """
+        order,predecessors = dependency_graph(task_list,group_sizes,
+                                              predecessors)
+
+        async def evaluate (i, predecessors) :
+            await asyncio.gather(*predecessors)
+            return await self._aevaluate(task_list[i])
+
+        #predecessors are always created first
+        running = [None] * len(task_list)
+        for i in order :
+            running[i] = asyncio.ensure_future(
+                    evaluate(i,[running[j] for j in predecessors[i]]) )
+
+        try :
+            delays = await asyncio.gather(*running)
+        except Exception :
+            for future in running :
+                future.cancel()
+            raise
+
+        #reinsert tasks in a deterministic order
+        tasks = self._tasks
+        for i in order :
+            if delays[i] is not None :
+                tasks.push(self._current_cycle + delays[i],task_list[i])
+
+    def _evaluate_cycle (self) :
+        """Evaluate all tasks of the next cycle in a private event loop.
+
+        Used by the synchronous `run`, `run_n` and `run_until`.
+        The queue must not be empty.
+        """
+        try :
+            asyncio.get_running_loop()
+        except RuntimeError :
+            pass
+        else :
+            raise RuntimeError("an event loop is running in this thread, "
+                               "use arun or arun_until")
+
+        if self._event_loop is None or self._event_loop.is_closed() :
+            self._event_loop = asyncio.new_event_loop()
+        self._event_loop.run_until_complete(self._aevaluate_cycle() )
+
+    def close (self) :
+        """Close the private event loop used by the synchronous run
+        methods.
+
+        A new one is created if they are called again.
+        """
+        loop = self._event_loop
+        self._event_loop = None
+        if loop is not None and not loop.is_closed() :
+            loop.run_until_complete(loop.shutdown_asyncgens() )
+            loop.close()
+
+    def __del__ (self) :
+        loop = getattr(self,"_event_loop",None)
+        if loop is not None and not loop.is_closed() \
+           and not loop.is_running() :
+            loop.close()
+
+    async def arun (self) :
+        """Evaluate one cycle of the scheduler.
+
+        Asynchronous equivalent of `run`.
+
+        yield the next cycle
+        """
+        tasks = self._tasks
+        while len(tasks) > 0 :
+            await self._aevaluate_cycle()
+
+            #return
+            if len(tasks) > 0 :
+                yield tasks.next_cycle()
+
+    async def arun_until (self, cycle) :
+        """Evaluate all cycles up to a given one included.
+
+        Asynchronous equivalent of `run_until`.
+
+        return: number of cycles actually evaluated
+        """
+        tasks = self._tasks
+        nb = 0
+        while len(tasks) > 0 and tasks.next_cycle() <= cycle :
+            await self._aevaluate_cycle()
+            nb += 1
+
+        if cycle > self._current_cycle :
+            self._current_cycle = cycle
+
+        return nb
@@ -21,13 +21,103 @@ This module defines a loop to evaluate a scheduler in a different thread
 __license__= "Cecill-C"
 __revision__=" $Id$ "
 
-from time import sleep
-from threading import Thread
+from time import monotonic
+from threading import Thread,Event,current_thread
+from .scheduler import save_snapshot
 
+###############################################
+#
+#    pacing policies
+#
+###############################################
+class FreeRun (object) :
+	"""Evaluate steps one after the other as fast as possible.
+	"""
+	def start (self, cycle) :
+		"""Called when the loop starts.
+		
+		:Parameters:
+		 - `cycle` (int) - current cycle of the scheduler
+		"""
+		pass
+	
+	def delay (self, next_cycle) :
+		"""Time to wait before evaluating the next step.
+		
+		:Parameters:
+		 - `next_cycle` (int) - cycle that will be evaluated next
+		
+		:Returns Type: float (seconds)
+		"""
+		return 0.
+
+class FixedRate (FreeRun) :
+	"""Evaluate a fixed number of steps per second.
+	
+	Steps are aligned on a fixed time grid so that the time spent
+	in a step does not accumulate. If the loop is late by more
+	than one step, the grid is reset instead of evaluating a burst
+	of steps.
+	"""
+	def __init__ (self, rate) :
+		"""Constructor
+		
+		:Parameters:
+		 - `rate` (float) - number of steps per second
+		"""
+		assert rate > 0
+		self._period = 1. / rate
+		self._next_time = None
+	
+	def start (self, cycle) :
+		self._next_time = monotonic()
+	
+	def delay (self, next_cycle) :
+		self._next_time += self._period
+		wait = self._next_time - monotonic()
+		if wait < - self._period :
+			self._next_time = monotonic()
+			return 0.
+		
+		return max(wait,0.)
+
+class RealTime (FreeRun) :
+	"""Align each cycle of the scheduler on the wall clock.
+	
+	Cycle `c` is evaluated `(c - c0) * cycle_duration` seconds after
+	the loop started on cycle `c0`. Empty cycles are waited for and
+	late cycles are evaluated immediately.
+	"""
+	def __init__ (self, cycle_duration) :
+		"""Constructor
+		
+		:Parameters:
+		 - `cycle_duration` (float) - duration of one cycle in seconds
+		"""
+		assert cycle_duration > 0
+		self._cycle_duration = cycle_duration
+		self._start_time = None
+		self._start_cycle = None
+	
+	def start (self, cycle) :
+		self._start_time = monotonic()
+		self._start_cycle = cycle
+	
+	def delay (self, next_cycle) :
+		target = self._start_time \
+		         + (next_cycle - self._start_cycle) * self._cycle_duration
+		return max(target - monotonic(),0.)
+
+###############################################
+#
+#    loop
+#
+###############################################
 class Loop (object) :
 	"""Create a thread to evaluate a scheduler.
 	"""
-	def __init__ (self, scheduler, post_step_func = None, init_func = None) :
+	def __init__ (self, scheduler, post_step_func = None, init_func = None,
+	                               pacing = None) :
 		"""Constructor
 		
 		.. warning:: for this object to works fine, especially with `reinit
@@ -40,6 +130,8 @@ class Loop (object) :
 		                                 will be called after each step
 		 - `init_func` (function) - a function that take no arguments and will
 		       be called at each reinitialisation (including this constructor)
+		 - `pacing` (FreeRun) - policy used to wait between two steps when
+		                        the loop is playing, default to FreeRun
 		"""
 		self._scheduler = scheduler
 		self._post_step_func = [] if post_step_func is None \
@@ -49,12 +141,20 @@ class Loop (object) :
 		self._running = False
 		self._step_in_progress = False
 		self._thread = None
+		self._stop = Event()
+		self._pacing = FreeRun() if pacing is None else pacing
+		
+		#periodic checkpoints
+		self._checkpoint_every = None
+		self._checkpoint_filename = None
+		self._last_checkpoint = None
+		self._nb_steps = 0
 		
 		#register initial state of the scheduler
 		if self._scheduler:
-			self._initial_state = tuple(self._scheduler._tasks) #TODO hack pabo
+			self._initial_state = self._scheduler.snapshot()
 		else:
-			self._initial_state = tuple() #TODO hack pabo
+			self._initial_state = None
 		
 		#initialise iterator
 		self.reinit()
@@ -74,6 +174,21 @@ class Loop (object) :
 		"""
 		return self._scheduler.current_cycle()
 	
+	def pacing (self) :
+		"""Policy used to wait between two steps.
+		"""
+		return self._pacing
+	
+	def set_pacing (self, pacing) :
+		"""Set the policy used to wait between two steps.
+		
+		Takes effect the next time the loop is played.
+		
+		:Parameters:
+		 - `pacing` (FreeRun) - a pacing policy or None for FreeRun
+		"""
+		self._pacing = FreeRun() if pacing is None else pacing
+	
 	def add_init_processing (self, func) :
 		if self._init_func is None :
 			self._init_func = [func]
@@ -88,18 +203,83 @@ class Loop (object) :
 		
 		sch = self._scheduler
 		if sch is not None :
-			sch._tasks = list(self._initial_state) #TODO hack pabo
-			sch._current_cycle = 0 #TODO hack pabo
+			sch.restore(self._initial_state,restore_enabled = False)
 			self._gen = sch.run()
 		
+		self._nb_steps = 0
+		
 		for init_func in self._init_func :
 			init_func()
 	
+	###############################################
+	#
+	#    checkpoints
+	#
+	###############################################
+	def enable_checkpoint (self, every, filename = None) :
+		"""Take a snapshot of the scheduler every few steps
+		
+		:Parameters:
+		 - `every` (int) - number of steps between two snapshots,
+		                   None to disable checkpoints
+		 - `filename` (str) - if not None, snapshots are also written
+		        in this file (see `save_snapshot`). A '%d' in the name is
+		        replaced by the current cycle to keep every checkpoint.
+		"""
+		assert every is None or every > 0
+		self._checkpoint_every = every
+		self._checkpoint_filename = filename
+	
+	def last_checkpoint (self) :
+		"""Last snapshot taken by periodic checkpoints or None.
+		"""
+		return self._last_checkpoint
+	
+	def checkpoint (self) :
+		"""Take a snapshot of the scheduler now
+		
+		Written on disk if a filename has been given
+		to `enable_checkpoint`.
+		
+		:Returns Type: dict (see `Scheduler.snapshot`)
+		"""
+		state = self._scheduler.snapshot()
+		self._last_checkpoint = state
+		
+		filename = self._checkpoint_filename
+		if filename is not None :
+			if "%d" in filename :
+				filename = filename % state["cycle"]
+			save_snapshot(state,filename)
+		
+		return state
+	
+	def restore (self, state) :
+		"""Resume the scheduler from a snapshot
+		
+		Evaluation continues from the cycle recorded in the snapshot.
+		
+		:Parameters:
+		 - `state` (dict) - a state returned by `Scheduler.snapshot`
+		                    or `load_snapshot`
+		"""
+		if self.running() :
+			self.pause()
+		
+		self._scheduler.restore(state)
+		self._gen = self._scheduler.run()
+	
 	def _step (self) :
 		"""Internal function that actually perform one step of the scheduler
 		"""
-		next_cycle = self._gen.next()
+		next_cycle = next(self._gen)
 		self._post_step_processing()
+		
+		self._nb_steps += 1
+		every = self._checkpoint_every
+		if every is not None and self._nb_steps % every == 0 :
+			self.checkpoint()
+		
 		return next_cycle
 	
 	def add_post_step_processing(self,func):
@@ -132,17 +312,33 @@ class Loop (object) :
 	def _loop (self) :
 		"""Internal function that advance step by step
 		as long as running is True.
+		
+		Stop by itself when the scheduler has no more tasks.
 		"""
-		while True :
-			if not self._running :
-				return
-			self._step()
-			sleep(0.01)
+		stop = self._stop
+		pacing = self._pacing
+		pacing.start(self.current_step() )
+		while not stop.is_set() :
+			try :
+				next_cycle = self._step()
+			except StopIteration :
+				break
+			
+			wait = pacing.delay(next_cycle)
+			if wait > 0 :
+				#interrupted as soon as pause is called
+				stop.wait(wait)
+		
+		self._running = False
 	
 	def play (self) :
 		"""Create a thread and evaluate the scheduler infinitely
 		"""
+		if self.running() :
+			return
+		
 		self._running = True
+		self._stop.clear()
 		self._thread = Thread(None,self._loop)
 		self._thread.start()
 	
@@ -153,12 +349,34 @@ class Loop (object) :
 		"""
 		#stop thread
 		self._running = False
+		self._stop.set()
 		
 		#kill thread properly
-		if self._thread is not None :
-			while self._thread.isAlive() :
-				sleep(0.01)
+		thread = self._thread
+		if thread is not None :
+			#pause called by a post step function
+			if thread is not current_thread() :
+				thread.join()
 			self._thread = None
+	
+	def join (self, timeout = None) :
+		"""Wait for the thread to finish without stopping it
+		
+		The thread finishes when the scheduler has no more tasks
+		or when `pause` is called.
+		
+		:Parameters:
+		 - `timeout` (float) - maximum time to wait in seconds,
+		                       None to wait as long as needed
+		
+		:Returns Type: bool, True if the thread is finished
+		"""
+		thread = self._thread
+		if thread is None :
+			return True
+		
+		thread.join(timeout)
+		return not thread.is_alive()
 
 
 
@@ -0,0 +1,291 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+This module defines a Profiler to record the time spent
+in each task evaluated by a scheduler.
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id$ "
+
+import json
+from collections import deque
+from random import Random
+from time import perf_counter
+
+def timed_evaluate_task (task) :
+    """Evaluate a task and return its delay and the time spent.
+
+    Module level function that can be sent to an executor
+    (including process pools).
+    """
+    t = perf_counter()
+    delay = task.evaluate()
+    return delay,perf_counter() - t
+
+def percentile (sorted_values, q) :
+    """Nearest rank percentile of a sorted list.
+
+    q: float in [0,100]
+    """
+    if len(sorted_values) == 0 :
+        return 0.
+    rank = int(round(q / 100. * (len(sorted_values) - 1) ) )
+    return sorted_values[rank]
+
+class TaskStats (object) :
+    """Timings recorded for a single task.
+    """
+    def __init__ (self, name, max_samples, random) :
+        self.name = name
+        self.calls = 0
+        self.total = 0.
+        self.max = 0.
+        self._samples = []
+        self._max_samples = max_samples
+        self._random = random
+
+    def add (self, duration) :
+        """Record one evaluation of the task.
+        """
+        self.calls += 1
+        self.total += duration
+        if duration > self.max :
+            self.max = duration
+
+        #reservoir sampling to bound memory
+        if len(self._samples) < self._max_samples :
+            self._samples.append(duration)
+        else :
+            ind = self._random.randrange(self.calls)
+            if ind < self._max_samples :
+                self._samples[ind] = duration
+
+    def summary (self) :
+        """Dict of statistics (times in seconds).
+        """
+        samples = sorted(self._samples)
+        return {"name":self.name,
+                "calls":self.calls,
+                "total":self.total,
+                "mean":self.total / self.calls if self.calls > 0 else 0.,
+                "p50":percentile(samples,50),
+                "p95":percentile(samples,95),
+                "max":self.max}
+
+class CycleStats (object) :
+    """Durations of evaluated cycles.
+
+    Count, total, maximum and number of overruns are exact, the
+    (cycle,duration,nb_tasks) records are a random sample of bounded
+    size and only the most recent overruns are kept.
+    """
+    def __init__ (self, budget, max_samples, random) :
+        self.budget = budget
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.nb_overruns = 0
+        self.overruns = deque(maxlen = max_samples)
+        self._samples = []
+        self._max_samples = max_samples
+        self._random = random
+
+    def add (self, cycle, duration, nb_tasks) :
+        """Record the evaluation of a cycle.
+        """
+        self.count += 1
+        self.total += duration
+        if duration > self.max :
+            self.max = duration
+        if self.budget is not None and duration > self.budget :
+            self.nb_overruns += 1
+            self.overruns.append( (cycle,duration) )
+
+        #reservoir sampling to bound memory
+        record = (cycle,duration,nb_tasks)
+        if len(self._samples) < self._max_samples :
+            self._samples.append(record)
+        else :
+            ind = self._random.randrange(self.count)
+            if ind < self._max_samples :
+                self._samples[ind] = record
+
+    def samples (self) :
+        """Sampled records sorted by cycle.
+        """
+        return sorted(self._samples)
+
+    def summary (self) :
+        """Dict of statistics (times in seconds).
+        """
+        durations = sorted(duration for cycle,duration,nb in self._samples)
+        return {"cycles":self.count,
+                "total":self.total,
+                "mean":self.total / self.count if self.count > 0 else 0.,
+                "p50":percentile(durations,50),
+                "p95":percentile(durations,95),
+                "max":self.max,
+                "budget":self.budget,
+                "overruns":self.nb_overruns}
+
+class Profiler (object) :
+    """Record time spent in each task and in each cycle.
+
+    Attach it to a scheduler with `Scheduler.set_profiler`.
+    Latency percentiles are computed on a random sample of at most
+    `max_samples` evaluations per task and cycles, counts, totals,
+    maximums and numbers of overruns are exact.
+    """
+    def __init__ (self, cycle_budget = None, max_samples = 1000) :
+        """Initialise the profiler.
+
+        cycle_budget: if not None, time in seconds above which a cycle
+                      is recorded as an overrun
+        max_samples: number of timings kept per task and for cycles to
+                     estimate percentiles, and number of recent
+                     overruns kept
+        """
+        self._cycle_budget = cycle_budget
+        self._max_samples = max_samples
+        self.reset()
+
+    def reset (self) :
+        """Forget all recorded timings.
+        """
+        self._random = Random(0)
+        self._tasks = {}
+        self._cycles = CycleStats(self._cycle_budget,self._max_samples,
+                                  self._random)
+
+    ###############################################
+    #
+    #    record
+    #
+    ###############################################
+    def evaluate (self, task) :
+        """Evaluate a task and record its duration.
+
+        return: the delay returned by the task
+        """
+        t = perf_counter()
+        delay = task.evaluate()
+        self.record_task(task,perf_counter() - t)
+        return delay
+
+    def record_task (self, task, duration) :
+        """Record one evaluation of a task.
+        """
+        try :
+            stats = self._tasks[task]
+        except KeyError :
+            name = task.name()
+            if not name :
+                func = task.func()
+                name = getattr(func,"__name__",repr(func) )
+            stats = TaskStats(name,self._max_samples,self._random)
+            self._tasks[task] = stats
+
+        stats.add(duration)
+
+    def record_cycle (self, cycle, duration, nb_tasks) :
+        """Record the evaluation of a whole cycle.
+        """
+        self._cycles.add(cycle,duration,nb_tasks)
+
+    ###############################################
+    #
+    #    accessors
+    #
+    ###############################################
+    def cycle_budget (self) :
+        """Time allowed for a cycle or None.
+        """
+        return self._cycle_budget
+
+    def task_stats (self) :
+        """List of statistics of each task, by decreasing total time.
+        """
+        stats = [st.summary() for st in self._tasks.values()]
+        stats.sort(key = lambda st : st["total"],reverse = True)
+        return stats
+
+    def cycles (self) :
+        """List of (cycle,duration,nb_tasks) of evaluated cycles.
+
+        All cycles up to `max_samples`, a random sample of them beyond.
+        """
+        return self._cycles.samples()
+
+    def overruns (self) :
+        """List of (cycle,duration) of the last `max_samples` cycles
+        above budget.
+        """
+        return list(self._cycles.overruns)
+
+    def cycle_stats (self) :
+        """Dict of statistics on the duration of cycles.
+        """
+        return self._cycles.summary()
+
+    ###############################################
+    #
+    #    export
+    #
+    ###############################################
+    def to_dict (self) :
+        """All statistics as a dict of builtin types.
+        """
+        return {"tasks":self.task_stats(),
+                "cycles":self.cycle_stats(),
+                "overruns":self.overruns()}
+
+    def to_json (self, filename = None) :
+        """Export statistics in JSON.
+
+        filename: if not None, also write the result in this file
+        return: str
+        """
+        txt = json.dumps(self.to_dict(),indent = 1)
+        if filename is not None :
+            with open(filename,'w') as f :
+                f.write(txt)
+        return txt
+
+    def table (self) :
+        """Human readable table of statistics (times in ms).
+
+        return: str
+        """
+        lines = ["%-30s %10s %12s %10s %10s %10s" % ("task","calls","total",
+                                                    "p50","p95","max")]
+        for st in self.task_stats() :
+            lines.append("%-30s %10d %12.3f %10.3f %10.3f %10.3f" % \
+                         (st["name"][:30],st["calls"],st["total"] * 1e3,
+                          st["p50"] * 1e3,st["p95"] * 1e3,st["max"] * 1e3) )
+
+        cst = self.cycle_stats()
+        lines.append("")
+        lines.append("%d cycles, total %.3f ms, p50 %.3f ms, "
+                     "p95 %.3f ms, max %.3f ms" % \
+                     (cst["cycles"],cst["total"] * 1e3,cst["p50"] * 1e3,
+                      cst["p95"] * 1e3,cst["max"] * 1e3) )
+        if cst["budget"] is not None :
+            lines.append("%d cycles over budget (%.3f ms)" % \
+                         (cst["overruns"],cst["budget"] * 1e3) )
+
+        return "\n".join(lines)
@@ -18,19 +18,180 @@
 __license__= "Cecill-C"
 __revision__=" $Id$ "
 
+import os
+import pickle
 from heapq import heappush,heappop
+from time import perf_counter
+from concurrent.futures import wait,FIRST_COMPLETED
+from .taskqueue import HeapQueue,TimingWheel
+from .profiler import timed_evaluate_task
+
+def evaluate_task (task) :
+    """Evaluate a task and return its delay.
+    
+    Module level function that can be sent to an executor
+    (including process pools).
+    """
+    return task.evaluate()
+
+def has_dependencies (task) :
+    """Tell wether a task declares dependencies on other tasks.
+    """
+    dependencies = getattr(task,"dependencies",None)
+    return dependencies is not None and len(dependencies() ) > 0
+
+def explicit_predecessors (task_list) :
+    """Resolve the dependencies declared by the tasks of a cycle.
+    
+    Dependencies on names that do not belong to a task of the list
+    are ignored.
+    
+    task_list: tasks of a cycle in their serial evaluation order
+    return: for each task, list of indices of the tasks it depends on
+    """
+    names = {}
+    for i,task in enumerate(task_list) :
+        name = task.name()
+        if name :
+            names.setdefault(name,[]).append(i)
+    
+    predecessors = [[] for task in task_list]
+    for i,task in enumerate(task_list) :
+        for dep in getattr(task,"dependencies",tuple)() :
+            for j in names.get(dep,()) :
+                if j != i :
+                    predecessors[i].append(j)
+    
+    return predecessors
+
+def dependency_graph (task_list, group_sizes = None, predecessors = None) :
+    """Order the tasks of a cycle according to their dependencies.
+    
+    Dependencies on names that do not belong to a task of the list
+    are ignored. Independent tasks keep their relative order in the
+    list, hence a list without dependencies is not modified.
+    
+    Tasks without resolved dependencies (in either direction) keep
+    the barriers between priority groups: they come after all tasks
+    of the groups of higher priority.
+    
+    task_list: tasks of a cycle in their serial evaluation order
+    group_sizes: number of tasks of each priority group, in
+                 task_list order, or None for a single group
+    predecessors: result of `explicit_predecessors` if already known
+    return: order,predecessors
+             - order: indices of tasks in a valid evaluation order
+             - predecessors: for each task, list of indices of tasks
+                             that must be evaluated before it
+    """
+    if predecessors is None :
+        predecessors = explicit_predecessors(task_list)
+    predecessors = [list(pred) for pred in predecessors]
+    
+    #implicit edges, frontier: tasks whose completion implies
+    #the completion of all previous groups
+    if group_sizes is not None :
+        linked = set()
+        for i,pred in enumerate(predecessors) :
+            if len(pred) > 0 :
+                linked.add(i)
+                linked.update(pred)
+        
+        frontier = []
+        start = 0
+        for size in group_sizes :
+            group = range(start,start + size)
+            barrier = False
+            for i in group :
+                if i not in linked and len(frontier) > 0 :
+                    predecessors[i] = list(frontier)
+                    barrier = True
+            if barrier :
+                frontier = list(group)
+            else :
+                frontier.extend(group)
+            start += size
+    
+    successors = [[] for task in task_list]
+    for i,pred in enumerate(predecessors) :
+        for j in pred :
+            successors[j].append(i)
+    
+    #topological sort, smallest index first
+    nb_pred = [len(pred) for pred in predecessors]
+    ready = [i for i,nb in enumerate(nb_pred) if nb == 0]
+    order = []
+    while len(ready) > 0 :
+        i = heappop(ready)
+        order.append(i)
+        for j in successors[i] :
+            nb_pred[j] -= 1
+            if nb_pred[j] == 0 :
+                heappush(ready,j)
+    
+    if len(order) < len(task_list) :
+        cyclic = [task_list[i].name() for i,nb in enumerate(nb_pred) if nb > 0]
+        raise ValueError("cyclic dependencies between tasks: %s" \
+                         % ", ".join(cyclic) )
+    
+    return order,predecessors
+
+def save_snapshot (state, filename) :
+    """Write a state returned by `Scheduler.snapshot` in a file.
+    
+    The file is written next to its final location then renamed,
+    so an interrupted write never corrupts a previous checkpoint.
+    Functions of tasks must be picklable.
+    """
+    tmp = filename + ".tmp"
+    with open(tmp,'wb') as f :
+        pickle.dump(state,f,pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp,filename)
+
+def load_snapshot (filename) :
+    """Read a state written by `save_snapshot`.
+    """
+    with open(filename,'rb') as f :
+        return pickle.load(f)
 
 class Scheduler (object) :
     """Call a set of tasks at regular time interval.
     """
-    def __init__ (self) :
+    backends = {"heap":HeapQueue,
+                "wheel":TimingWheel}
+    
+    def __init__ (self, backend = "heap", executor = None) :
         """Initialise the Scheduler.
+        
+        backend: name of the queue used to store tasks
+                 - "heap" a binary heap, cheap for few tasks
+                 - "wheel" a timing wheel, register and reinsert
+                   tasks in constant time, for many periodic tasks
+                 Both backends evaluate tasks in the same order.
+        executor: a concurrent.futures executor used to evaluate
+                  tasks of the same cycle and priority (see
+                  `set_executor`). If None, tasks are evaluated
+                  one after the other in the current thread.
         """
+        if backend not in self.backends :
+            raise ValueError("unknown backend: %s" % str(backend) )
+        
+        self._backend = backend
+        
         #current step of evaluation
         self._current_cycle = 0
         
-        #heapqueue of tasks
-        self._tasks = []
+        #queue of tasks
+        self._tasks = self._new_queue()
+        
+        #pool used to evaluate tasks concurrently
+        self._executor = executor
+        
+        #timings of tasks
+        self._profiler = None
+        
+        #at least one task declares dependencies
+        self._use_dependencies = False
     
     ###############################################
     #
@@ -42,6 +203,21 @@ class Scheduler (object) :
         """
         return (task for cycle,task in self._tasks)
     
+    def backend (self) :
+        """Name of the queue used to store tasks.
+        """
+        return self._backend
+    
+    def executor (self) :
+        """Executor used to evaluate tasks concurrently or None.
+        """
+        return self._executor
+    
+    def profiler (self) :
+        """Profiler recording timings of tasks or None.
+        """
+        return self._profiler
+    
     def current_cycle (self) :
         """Retrieve the value of the current cycle
         
@@ -50,6 +226,13 @@ class Scheduler (object) :
         """
         return self._current_cycle
     
+    def _new_queue (self, entries = ()) :
+        """Create a queue of the type used by this scheduler.
+        
+        entries: iterable of (cycle,task) to store in the queue
+        """
+        return self.backends[self._backend](entries)
+    
     ###############################################
     #
     #    edit
@@ -68,39 +251,329 @@ class Scheduler (object) :
         else :
             assert start_time >= self._current_cycle
         
-        heappush(self._tasks, (start_time,task) )
+        self._tasks.push(start_time,task)
+        
+        if has_dependencies(task) :
+            self._use_dependencies = True
+    
+    def register_many (self, tasks, start_times = None) :
+        """Register a list of tasks in the scheduler.
+        
+        Faster than calling `register` for each task, the queue
+        is updated only once.
+        
+        tasks: iterable of Task objects
+        start_times: iterable of start time for each task (see
+                     `register`) or None to use task delays for
+                     all of them
+        """
+        current = self._current_cycle
+        if start_times is None :
+            entries = [(current + task.delay(),task) for task in tasks]
+        else :
+            entries = []
+            for task,start_time in zip(tasks,start_times) :
+                if start_time is None :
+                    start_time = current + task.delay()
+                else :
+                    assert start_time >= current
+                entries.append( (start_time,task) )
+        
+        self._tasks.extend(entries)
+        
+        if any(has_dependencies(task) for cycle,task in entries) :
+            self._use_dependencies = True
+    
+    def set_executor (self, executor) :
+        """Set the executor used to evaluate tasks concurrently.
+        
+        Tasks of the same cycle with the same priority are sent together
+        to the executor. Groups of tasks are still evaluated by decreasing
+        priority and a group is finished before the next one starts.
+        Tasks are reinserted in the queue in the same order as a serial
+        evaluation, hence the sequence of cycles is not modified.
+        
+        .. warning:: with a process pool each task is evaluated on a copy,
+                     its function must be picklable and its side effects
+                     are not seen by the current process.
+        
+        executor: a concurrent.futures.Executor or None to come back
+                  to a serial evaluation
+        """
+        self._executor = executor
+    
+    def set_profiler (self, profiler) :
+        """Set the profiler used to record timings of tasks.
+        
+        profiler: a Profiler or None to stop recording
+        """
+        self._profiler = profiler
+    
+    ###############################################
+    #
+    #    checkpoint
+    #
+    ###############################################
+    def snapshot (self) :
+        """Retrieve the current state of the scheduler.
+        
+        The state is a dict with:
+         - 'cycle': the current cycle
+         - 'tasks': list of (cycle,task) waiting in the queue,
+                    sorted by cycle
+         - 'enabled': evaluation flag of each task in 'tasks'
+        
+        Tasks are not copied, use `save_snapshot` to write an
+        independent copy on disk.
+        """
+        entries = sorted(self._tasks,key = lambda entry : entry[0])
+        return {"cycle":self._current_cycle,
+                "tasks":entries,
+                "enabled":[task.evaluation_enabled() \
+                           for cycle,task in entries]}
+    
+    def restore (self, state, restore_enabled = True) :
+        """Come back to a state returned by `snapshot`.
+        
+        Generators returned by `run` continue from the restored state.
+        
+        state: a dict returned by snapshot or load_snapshot
+        restore_enabled: if True, also set the evaluation flag
+                         of each task to its recorded value
+        """
+        tasks = self._tasks
+        tasks.clear()
+        for cycle,task in state["tasks"] :
+            tasks.push(cycle,task)
+            if has_dependencies(task) :
+                self._use_dependencies = True
+        
+        if restore_enabled :
+            for (cycle,task),enabled in zip(state["tasks"],state["enabled"]) :
+                task.enable_evaluation(enabled)
+        
+        self._current_cycle = state["cycle"]
     
     ###############################################
     #
     #    evaluate
     #
     ###############################################
+    def _evaluate_cycle (self) :
+        """Evaluate all tasks of the next cycle.
+        
+        The queue must not be empty.
+        """
+        tasks = self._tasks
+        
+        #retrieve tasks to evaluate at this cycle
+        #sorted by priority
+        self._current_cycle,groups = tasks.pop_cycle()
+        
+        #evaluate
+        executor = self._executor
+        profiler = self._profiler
+        if profiler is not None :
+            cycle_start = perf_counter()
+            nb_tasks = 0
+        
+        if self._use_dependencies :
+            task_list = [task for priority,group in groups for task in group]
+            if any(has_dependencies(task) for task in task_list) :
+                explicit = explicit_predecessors(task_list)
+            else :
+                explicit = ()
+            #graph mode only if some dependencies are resolved
+            if any(len(pred) > 0 for pred in explicit) :
+                self._evaluate_graph(task_list,
+                                     [len(group) for priority,group in groups],
+                                     explicit)
+                if profiler is not None :
+                    profiler.record_cycle(self._current_cycle,
+                                          perf_counter() - cycle_start,
+                                          len(task_list) )
+                return
+        
+        for priority,task_list in groups :
+            if executor is None or len(task_list) == 1 :
+                for task in task_list :
+                    #evaluate the task
+                    if profiler is None :
+                        delay = task.evaluate()
+                    else :
+                        delay = profiler.evaluate(task)
+                    #reinsert the task in the queue
+                    if delay is not None :
+                        tasks.push(self._current_cycle + delay,task)
+            elif profiler is None :
+                #evaluate all tasks of the group concurrently
+                delays = executor.map(evaluate_task,task_list)
+                #reinsert them in the group order
+                for task,delay in zip(task_list,delays) :
+                    if delay is not None :
+                        tasks.push(self._current_cycle + delay,task)
+            else :
+                results = executor.map(timed_evaluate_task,task_list)
+                for task,(delay,duration) in zip(task_list,results) :
+                    profiler.record_task(task,duration)
+                    if delay is not None :
+                        tasks.push(self._current_cycle + delay,task)
+            
+            if profiler is not None :
+                nb_tasks += len(task_list)
+        
+        if profiler is not None :
+            profiler.record_cycle(self._current_cycle,
+                                  perf_counter() - cycle_start,
+                                  nb_tasks)
+    
+    def _evaluate_graph (self, task_list, group_sizes = None,
+                         predecessors = None) :
+        """Evaluate the tasks of a cycle according to their dependencies.
+        
+        Without executor, tasks are evaluated one after the other in
+        the order given by `dependency_graph`. With an executor, every
+        task is sent as soon as all its predecessors are finished.
+        Tasks with dependencies are sent whatever their priority, the
+        others wait for the groups of higher priority. In both cases,
+        tasks are reinserted in the queue in the order given by
+        `dependency_graph`.
+        
+        task_list: tasks of the current cycle in their serial
+                   evaluation order
+        group_sizes, predecessors: see `dependency_graph`
+        """
+        tasks = self._tasks
+        executor = self._executor
+        profiler = self._profiler
+        order,predecessors = dependency_graph(task_list,group_sizes,
+                                              predecessors)
+        
+        if executor is None :
+            for i in order :
+                task = task_list[i]
+                if profiler is None :
+                    delay = task.evaluate()
+                else :
+                    delay = profiler.evaluate(task)
+                if delay is not None :
+                    tasks.push(self._current_cycle + delay,task)
+            return
+        
+        func = evaluate_task if profiler is None else timed_evaluate_task
+        nb_pred = [len(pred) for pred in predecessors]
+        successors = [[] for task in task_list]
+        for i,pred in enumerate(predecessors) :
+            for j in pred :
+                successors[j].append(i)
+        
+        results = [None] * len(task_list)
+        running = {}
+        for i in order :
+            if nb_pred[i] == 0 :
+                running[executor.submit(func,task_list[i])] = i
+        
+        while len(running) > 0 :
+            done,not_done = wait(running,return_when = FIRST_COMPLETED)
+            for future in done :
+                i = running.pop(future)
+                try :
+                    results[i] = future.result()
+                except Exception :
+                    for other in running :
+                        other.cancel()
+                    raise
+                
+                for j in successors[i] :
+                    nb_pred[j] -= 1
+                    if nb_pred[j] == 0 :
+                        running[executor.submit(func,task_list[j])] = j
+        
+        #reinsert tasks in a deterministic order
+        for i in order :
+            task = task_list[i]
+            if profiler is None :
+                delay = results[i]
+            else :
+                delay,duration = results[i]
+                profiler.record_task(task,duration)
+            if delay is not None :
+                tasks.push(self._current_cycle + delay,task)
+    
     def run (self) :
         """Evaluate one cycle of the scheduler.
         
         yield the next cycle
         """
         tasks = self._tasks
+        evaluate_cycle = self._evaluate_cycle
         while len(tasks) > 0 :
-            #retrieve tasks to evaluate at this cycle
-            self._current_cycle,task = heappop(tasks)
-            task_list = [(task.priority(),task)]
-            while len(tasks) > 0 and tasks[0][0] == self._current_cycle :
-                cc,task = heappop(tasks)
-                task_list.append( (task.priority(),task) )
-            
-            #sort task by priority
-            task_list.sort(reverse = True)
-            
-            #evaluate
-            for priority,task in task_list :
-                #evaluate the task
-                delay = task.evaluate()
-                #reinsert the task in the heapqueue
-                if delay is not None :
-                    heappush(tasks, (self._current_cycle + delay,task) )
+            evaluate_cycle()
             
             #return
             if len(tasks) > 0 :
-                yield tasks[0][0]
-
+                yield tasks.next_cycle()
+    
+    def run_n (self, nb_steps, post_step = None, every = 1) :
+        """Evaluate a given number of cycles in a row.
+        
+        Equivalent to nb_steps calls to next on the generator returned
+        by `run`, without the generator. Cycles without tasks are
+        skipped in one jump and do not count as steps.
+        
+        nb_steps: number of cycles to evaluate
+        post_step: a function without arguments called every
+                   `every` evaluated cycles, or None
+        every: number of cycles between two calls to post_step
+        return: number of cycles actually evaluated, smaller than
+                nb_steps if the scheduler ran out of tasks
+        """
+        assert every > 0
+        tasks = self._tasks
+        evaluate_cycle = self._evaluate_cycle
+        
+        if post_step is None :
+            for i in range(nb_steps) :
+                if len(tasks) == 0 :
+                    return i
+                evaluate_cycle()
+            return nb_steps
+        
+        for i in range(nb_steps) :
+            if len(tasks) == 0 :
+                return i
+            evaluate_cycle()
+            if (i + 1) % every == 0 :
+                post_step()
+        return nb_steps
+    
+    def run_until (self, cycle, post_step = None, every = 1) :
+        """Evaluate all cycles up to a given one included.
+        
+        Cycles without tasks are skipped in one jump. At the end,
+        the current cycle is `cycle`, even if no task was scheduled
+        on it, so that tasks registered afterward are placed
+        relatively to it.
+        
+        cycle: last cycle to evaluate
+        post_step: a function without arguments called every
+                   `every` evaluated cycles, or None
+        every: number of evaluated cycles between two calls
+               to post_step
+        return: number of cycles actually evaluated
+        """
+        assert every > 0
+        tasks = self._tasks
+        evaluate_cycle = self._evaluate_cycle
+        
+        nb = 0
+        while len(tasks) > 0 and tasks.next_cycle() <= cycle :
+            evaluate_cycle()
+            nb += 1
+            if post_step is not None and nb % every == 0 :
+                post_step()
+        
+        if cycle > self._current_cycle :
+            self._current_cycle = cycle
+        
+        return nb
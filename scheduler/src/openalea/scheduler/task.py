@@ -26,20 +26,33 @@ class Task (object) :
     """Handle a function that will be called regularly.
     
     Atomic even handled by a scheduler
+    
+    Attributes are stored in slots to keep tasks small when a
+    scheduler handles a large number of them.
     """
-    def __init__ (self, func, delay, priority, name = "") :
+    __slots__ = ("_func","_delay","_priority","_name","_dependencies",
+                 "_evaluate","__weakref__")
+    
+    def __init__ (self, func, delay, priority, name = "", dependencies = ()) :
         """Intialiser the task.
         
         func: the function that will be called
         delay: frequency of call to the function
         priority: a way to order different task that
                   must be executed at the same time
+        name: name of the task
+        dependencies: names of tasks that must be evaluated
+                      before this one when they fall on the same cycle
         """
         assert callable(func)
+        if isinstance(dependencies,str) :
+            dependencies = (dependencies,)
+        
         self._func = func
         self._delay = delay
         self._priority = priority
         self._name = name
+        self._dependencies = tuple(dependencies)
         
         self._evaluate = True
     
@@ -67,6 +80,20 @@ class Task (object) :
         """Retrieve the name of this task.
         """
         return self._name
+    
+    def dependencies (self) :
+        """Retrieve the names of tasks this one depends on.
+        """
+        return self._dependencies
+    
+    def __lt__ (self, other) :
+        """Arbitrary but stable order between tasks.
+        
+        Used by the scheduler to sort tasks with the same priority,
+        follow the default python 2 order of objects.
+        """
+        return id(self) < id(other)
+    
     ###############################################
     #
     #    evaluation of the function
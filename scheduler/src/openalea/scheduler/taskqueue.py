@@ -0,0 +1,276 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+This module defines the queues used by a Scheduler to store
+tasks waiting for their evaluation cycle.
+
+Every queue stores `(cycle,task)` entries and returns, for the next
+cycle, the tasks grouped by priority in evaluation order.
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id$ "
+
+from heapq import heappush,heappop,heapify
+
+class HeapQueue (object) :
+    """Binary heap of `(cycle,task)` entries.
+
+    Each access reorders the heap and each cycle sorts its
+    tasks by priority.
+    """
+    def __init__ (self, entries = ()) :
+        """Initialise the queue.
+
+        entries: iterable of (cycle,task) to store
+        """
+        self._heap = list(entries)
+        heapify(self._heap)
+
+    def __len__ (self) :
+        return len(self._heap)
+
+    def __iter__ (self) :
+        """Iterate on all `(cycle,task)` entries (no specific order).
+        """
+        return iter(self._heap)
+
+    def clear (self) :
+        """Remove all entries.
+        """
+        del self._heap[:]
+
+    def push (self, cycle, task) :
+        """Store a task to be evaluated at the given cycle.
+        """
+        heappush(self._heap, (cycle,task) )
+
+    def extend (self, entries) :
+        """Store many `(cycle,task)` entries at once.
+
+        The heap is rebuilt once instead of pushing
+        entries one by one.
+        """
+        heap = self._heap
+        entries = list(entries)
+        if len(entries) > len(heap) :
+            heap.extend(entries)
+            heapify(heap)
+        else :
+            for entry in entries :
+                heappush(heap,entry)
+
+    def next_cycle (self) :
+        """Retrieve the smallest cycle stored in the queue.
+        """
+        return self._heap[0][0]
+
+    def pop_cycle (self) :
+        """Remove all tasks of the next cycle.
+
+        return: cycle,[(priority,[task,...]),...] with priorities
+                in decreasing order
+        """
+        heap = self._heap
+        cycle,task = heappop(heap)
+        task_list = [(task.priority(),task)]
+        while len(heap) > 0 and heap[0][0] == cycle :
+            cc,task = heappop(heap)
+            task_list.append( (task.priority(),task) )
+
+        #sort task by priority
+        task_list.sort(reverse = True)
+
+        #group them
+        groups = []
+        current = None
+        for priority,task in task_list :
+            if current is None or priority != current[0] :
+                current = (priority,[])
+                groups.append(current)
+            current[1].append(task)
+
+        return cycle,groups
+
+class TimingWheel (object) :
+    """Calendar queue of `(cycle,task)` entries.
+
+    Cycles in the window `[base,base + size)` are stored in a ring
+    of slots indexed by `cycle % size`. Each slot holds one bucket
+    per priority so that registering a task and reinserting it after
+    its evaluation only cost a dict lookup and a list append.
+    Cycles outside the window are stored in an overflow calendar.
+
+    The evaluation order is the same as the one of HeapQueue:
+    decreasing priority, then decreasing task order.
+
+    .. warning:: the priority of a task is read when the task is pushed
+                 in the queue, not when its cycle is reached.
+    """
+    def __init__ (self, entries = (), size = 256) :
+        """Initialise the queue.
+
+        entries: iterable of (cycle,task) to store
+        size: number of slots in the wheel, i.e. the
+              largest delay handled without overflow
+        """
+        assert size > 0
+        self._size = size
+        self.clear()
+
+        for cycle,task in entries :
+            self.push(cycle,task)
+
+    def __len__ (self) :
+        return self._len
+
+    def __iter__ (self) :
+        """Iterate on all `(cycle,task)` entries (no specific order).
+        """
+        if self._nb_in_wheel > 0 :
+            for i in range(self._size) :
+                slot = self._slots[(self._base + i) % self._size]
+                if slot is not None :
+                    for bucket in slot.values() :
+                        for task in bucket :
+                            yield (self._base + i,task)
+
+        for cycle,slot in self._overflow.items() :
+            for bucket in slot.values() :
+                for task in bucket :
+                    yield (cycle,task)
+
+    def clear (self) :
+        """Remove all entries.
+        """
+        self._slots = [None] * self._size
+        self._base = None
+        self._nb_in_wheel = 0
+
+        #far away cycles: {cycle:{priority:[task,...]}}
+        self._overflow = {}
+        #heapqueue of cycles in overflow
+        self._overflow_cycles = []
+
+        self._len = 0
+
+    def push (self, cycle, task) :
+        """Store a task to be evaluated at the given cycle.
+        """
+        if self._base is None :
+            self._base = cycle
+
+        if self._base <= cycle < self._base + self._size :
+            ind = cycle % self._size
+            slot = self._slots[ind]
+            if slot is None :
+                slot = {}
+                self._slots[ind] = slot
+            self._nb_in_wheel += 1
+        else :
+            slot = self._overflow.get(cycle)
+            if slot is None :
+                slot = {}
+                self._overflow[cycle] = slot
+                heappush(self._overflow_cycles,cycle)
+
+        priority = task.priority()
+        try :
+            slot[priority].append(task)
+        except KeyError :
+            slot[priority] = [task]
+
+        self._len += 1
+
+    def extend (self, entries) :
+        """Store many `(cycle,task)` entries at once.
+        """
+        push = self.push
+        for cycle,task in entries :
+            push(cycle,task)
+
+    def _next_wheel_cycle (self) :
+        """Smallest cycle stored in the wheel or None.
+        """
+        if self._nb_in_wheel == 0 :
+            return None
+
+        slots = self._slots
+        size = self._size
+        cycle = self._base
+        while slots[cycle % size] is None :
+            cycle += 1
+
+        return cycle
+
+    def next_cycle (self) :
+        """Retrieve the smallest cycle stored in the queue.
+        """
+        cycle = self._next_wheel_cycle()
+        if len(self._overflow_cycles) > 0 :
+            if cycle is None or self._overflow_cycles[0] < cycle :
+                cycle = self._overflow_cycles[0]
+
+        if cycle is None :
+            raise IndexError("empty queue")
+
+        return cycle
+
+    def pop_cycle (self) :
+        """Remove all tasks of the next cycle.
+
+        return: cycle,[(priority,[task,...]),...] with priorities
+                in decreasing order
+        """
+        cycle = self.next_cycle()
+
+        #retrieve tasks stored in the wheel
+        slot = None
+        if self._base <= cycle < self._base + self._size :
+            ind = cycle % self._size
+            slot = self._slots[ind]
+            if slot is not None :
+                self._slots[ind] = None
+                self._nb_in_wheel -= sum(len(bucket) \
+                                         for bucket in slot.values() )
+
+        #retrieve tasks stored in the overflow
+        if len(self._overflow_cycles) > 0 \
+           and self._overflow_cycles[0] == cycle :
+            heappop(self._overflow_cycles)
+            far_slot = self._overflow.pop(cycle)
+            if slot is None :
+                slot = far_slot
+            else :
+                for priority,bucket in far_slot.items() :
+                    try :
+                        slot[priority].extend(bucket)
+                    except KeyError :
+                        slot[priority] = bucket
+
+        #move the window, all cycles before this one are empty
+        if cycle > self._base :
+            self._base = cycle
+
+        groups = []
+        for priority in sorted(slot, reverse = True) :
+            bucket = slot[priority]
+            bucket.sort(reverse = True)
+            groups.append( (priority,bucket) )
+            self._len -= len(bucket)
+
+        return cycle,groups
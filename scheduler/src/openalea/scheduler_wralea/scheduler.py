@@ -109,11 +109,13 @@ def register_task (scheduler, function, delay, priority, name, start) :
     return scheduler,
 
 def run (scheduler, nb_step, set_current_cycle) :
-    g = scheduler.run()
-    for i in range(nb_step):
-        next_cycle = g.next()
-        if set_current_cycle is not None :
+    if set_current_cycle is None :
+        scheduler.run_n(nb_step)
+    else :
+        def post_step () :
             set_current_cycle(scheduler.current_cycle() )
+        
+        scheduler.run_n(nb_step,post_step)
     
     return scheduler,
 
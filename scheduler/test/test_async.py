@@ -0,0 +1,134 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA  
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+# 
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+asynchronous scheduler unit tests
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id"
+
+import asyncio
+from time import monotonic,sleep
+from openalea.scheduler import Task,AsyncScheduler
+
+def test_arun () :
+    evaluated = []
+    
+    async def io_task (i = 0) :
+        await asyncio.sleep(0.05)
+        evaluated.append(i)
+    
+    async def io_task2 () :
+        await io_task(2)
+    
+    def sync_task () :
+        evaluated.append(1)
+    
+    s = AsyncScheduler()
+    for i in range(10) :
+        s.register(Task(io_task,1,1),0)
+    s.register(Task(io_task2,2,0),0)
+    s.register(Task(sync_task,1,2),0)
+    
+    async def main () :
+        cycles = []
+        async for cycle in s.arun() :
+            cycles.append(cycle)
+            if len(cycles) == 3 :
+                break
+        return cycles
+    
+    t = monotonic()
+    cycles = asyncio.run(main() )
+    #same priority tasks are awaited concurrently
+    assert monotonic() - t < 0.4
+    assert cycles == [1,2,3]
+    assert evaluated[:12] == [1] + [0] * 10 + [2]
+    assert len(evaluated) == 3 * 11 + 2
+
+def test_arun_until () :
+    evaluated = []
+    
+    async def f () :
+        evaluated.append(1)
+    
+    s = AsyncScheduler()
+    s.register(Task(f,2,0),0)
+    assert asyncio.run(s.arun_until(10) ) == 6
+    assert s.current_cycle() == 10
+    assert len(evaluated) == 6
+
+def test_sync_run () :
+    from openalea.scheduler import Loop
+    evaluated = []
+    
+    async def io_task () :
+        await asyncio.sleep(0)
+        evaluated.append(0)
+    
+    s = AsyncScheduler()
+    s.register(Task(io_task,1,0),0)
+    assert s.run_n(3) == 3
+    assert evaluated == [0] * 3
+    assert s.run_until(5) == 3
+    assert evaluated == [0] * 6
+    
+    g = s.run()
+    next(g)
+    assert evaluated == [0] * 7
+    
+    #Loop evaluates cycles in its own thread
+    loop = Loop(s)
+    loop.play()
+    while len(evaluated) < 20 :
+        sleep(0.001)
+    loop.pause()
+    
+    async def main () :
+        s.run_n(1)
+    
+    try :
+        asyncio.run(main() )
+        assert False
+    except RuntimeError :
+        pass
+
+def test_awaitable_results () :
+    import warnings
+    evaluated = []
+    
+    class IOTask (object) :
+        async def __call__ (self) :
+            await asyncio.sleep(0)
+            evaluated.append("call")
+    
+    async def io_task () :
+        evaluated.append("lambda")
+    
+    s = AsyncScheduler()
+    s.register(Task(IOTask(),1,0),0)
+    s.register(Task(lambda : io_task(),1,1),0)
+    with warnings.catch_warnings() :
+        warnings.simplefilter("error")
+        assert s.run_n(2) == 2
+        s.close()
+    assert sorted(evaluated) == ["call","call","lambda","lambda"]
+    
+    #a new private loop is created after close
+    assert s.run_n(1) == 1
+    assert len(evaluated) == 6
+    s.close()
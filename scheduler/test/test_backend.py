@@ -0,0 +1,111 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA  
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+# 
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+scheduler backends unit tests
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id"
+
+from random import Random
+from openalea.scheduler import Task,Scheduler
+
+def create_tasks (evaluated, nb, seed) :
+    rd = Random(seed)
+    tasks = []
+    for i in range(nb) :
+        def func (i = i) :
+            evaluated.append(i)
+        
+        #delays larger than the wheel are stored in overflow
+        delay = rd.choice( (1,1,2,3,7,300,1000) )
+        tasks.append( (Task(func,delay,rd.randint(0,3) ),rd.randint(0,20) ) )
+    
+    return tasks
+
+def run_backend (backend, tasks, evaluated, nb_steps) :
+    del evaluated[:]
+    s = Scheduler(backend)
+    for task,start in tasks :
+        s.register(task,start)
+    
+    cycles = []
+    g = s.run()
+    for i in range(nb_steps) :
+        cycles.append(next(g) )
+    
+    return cycles,tuple(evaluated)
+
+def test_same_order () :
+    evaluated = []
+    tasks = create_tasks(evaluated,200,0)
+    
+    ref = run_backend("heap",tasks,evaluated,2500)
+    res = run_backend("wheel",tasks,evaluated,2500)
+    assert res == ref
+
+def test_reinsert_same_cycle () :
+    evaluated = []
+    def f () :
+        evaluated.append(len(evaluated) )
+        if len(evaluated) < 3 :
+            return 0
+        return 1
+    
+    class ZeroTask (Task) :
+        def evaluate (self) :
+            return self._func()
+    
+    s = Scheduler("wheel")
+    s.register(ZeroTask(f,1,0),0)
+    g = s.run()
+    assert [next(g) for i in range(4)] == [0,0,1,2]
+    assert s.current_cycle() == 1
+
+def test_unknown_backend () :
+    try :
+        Scheduler("unknown")
+        assert False
+    except ValueError :
+        pass
+
+def test_register_many () :
+    for backend in ("heap","wheel") :
+        evaluated = []
+        tasks = create_tasks(evaluated,100,1)
+        ref = run_backend(backend,tasks,evaluated,500)
+        
+        del evaluated[:]
+        s = Scheduler(backend)
+        s.register(tasks[0][0],tasks[0][1])
+        s.register_many([task for task,start in tasks[1:]],
+                        [start for task,start in tasks[1:]])
+        g = s.run()
+        cycles = [next(g) for i in range(500)]
+        assert (cycles,tuple(evaluated) ) == ref
+    
+    s = Scheduler()
+    s.register_many([Task(lambda : None,3,0),Task(lambda : None,5,0)])
+    assert next(s.run() ) == 5
+    
+def test_slots () :
+    task = Task(lambda : None,1,0)
+    try :
+        task.foo = 1
+        assert False
+    except AttributeError :
+        pass
@@ -0,0 +1,80 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA  
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+# 
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+batch evaluation unit tests
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id"
+
+from openalea.scheduler import Task,Scheduler
+
+def create_scheduler (evaluated) :
+    def f1 () :
+        evaluated.append(1)
+    
+    def f2 () :
+        evaluated.append(2)
+    
+    s = Scheduler()
+    s.register(Task(f1,1,2),0)
+    s.register(Task(f2,10,1),20)
+    return s
+
+def test_run_n () :
+    ref = []
+    s = create_scheduler(ref)
+    g = s.run()
+    for i in range(30) :
+        next(g)
+    ref_cycle = s.current_cycle()
+    
+    evaluated = []
+    s = create_scheduler(evaluated)
+    cycles = []
+    def post_step () :
+        cycles.append(s.current_cycle() )
+    
+    assert s.run_n(30,post_step,every = 10) == 30
+    assert evaluated == ref
+    assert s.current_cycle() == ref_cycle
+    assert cycles == [9,19,29]
+
+def test_run_n_exhausted () :
+    class OnceTask (Task) :
+        def evaluate (self) :
+            Task.evaluate(self)
+    
+    s = Scheduler()
+    s.register(OnceTask(lambda : None,1,0),0)
+    s.register(OnceTask(lambda : None,1,0),5)
+    assert s.run_n(10) == 2
+    assert s.current_cycle() == 5
+
+def test_run_until () :
+    evaluated = []
+    s = create_scheduler(evaluated)
+    assert s.run_until(25) == 26
+    assert evaluated.count(2) == 1
+    assert s.current_cycle() == 25
+    
+    #jump over empty cycles
+    s = Scheduler()
+    s.register(Task(lambda : None,100,0),0)
+    assert s.run_until(1000) == 11
+    assert s.current_cycle() == 1000
+    assert next(s.run() ) == 1200
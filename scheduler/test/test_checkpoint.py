@@ -0,0 +1,106 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA  
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+# 
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+checkpoint unit tests
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id"
+
+import os
+from tempfile import mkdtemp
+from openalea.scheduler import (Task,Scheduler,Loop,
+                                save_snapshot,load_snapshot)
+
+evaluated = []
+
+def f1 () :
+    evaluated.append(1)
+
+def f2 () :
+    evaluated.append(2)
+
+def create_scheduler (backend) :
+    s = Scheduler(backend)
+    s.register(Task(f1,1,2),0)
+    s.register(Task(f2,3,1),0)
+    return s
+
+def test_restore () :
+    for backend in ("heap","wheel") :
+        s = create_scheduler(backend)
+        g = s.run()
+        for i in range(10) :
+            next(g)
+        
+        state = s.snapshot()
+        assert state["cycle"] == s.current_cycle()
+        
+        del evaluated[:]
+        ref = [next(g) for i in range(5)]
+        ref_evaluated = list(evaluated)
+        
+        s.restore(state)
+        del evaluated[:]
+        assert [next(g) for i in range(5)] == ref
+        assert evaluated == ref_evaluated
+
+def test_restore_enabled () :
+    s = create_scheduler("heap")
+    state = s.snapshot()
+    for task in s.tasks() :
+        task.enable_evaluation(False)
+    
+    s.restore(state,restore_enabled = False)
+    assert not any(task.evaluation_enabled() for task in s.tasks() )
+    s.restore(state)
+    assert all(task.evaluation_enabled() for task in s.tasks() )
+
+def test_save_load () :
+    s = create_scheduler("wheel")
+    g = s.run()
+    for i in range(7) :
+        next(g)
+    
+    filename = os.path.join(mkdtemp(),"state.pkl")
+    save_snapshot(s.snapshot(),filename)
+    
+    s2 = Scheduler("wheel")
+    s2.restore(load_snapshot(filename) )
+    assert s2.current_cycle() == s.current_cycle()
+    assert next(s2.run() ) == next(g)
+
+def test_loop_checkpoint () :
+    dirname = mkdtemp()
+    loop = Loop(create_scheduler("heap") )
+    loop.enable_checkpoint(4,os.path.join(dirname,"state_%d.pkl") )
+    for i in range(8) :
+        loop.step()
+    
+    state = loop.last_checkpoint()
+    assert state["cycle"] == loop.current_step()
+    assert len(os.listdir(dirname) ) == 2
+    
+    loop.step()
+    loop.restore(load_snapshot(os.path.join(dirname,
+                                            "state_%d.pkl" % state["cycle"]) ) )
+    assert loop.current_step() == state["cycle"]
+    
+    #reinit comes back to cycle 0
+    loop.reinit()
+    assert loop.current_step() == 0
+    assert loop.step() == 1
@@ -0,0 +1,133 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA  
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+# 
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+task dependencies unit tests
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id"
+
+import asyncio
+from threading import Lock
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from openalea.scheduler import Task,Scheduler,AsyncScheduler
+from openalea.scheduler.scheduler import dependency_graph
+
+def create_tasks (evaluated, scheduler) :
+    lock = Lock()
+    def func (name) :
+        def f () :
+            sleep(0.01)
+            with lock :
+                evaluated.append( (scheduler.current_cycle(),name) )
+        return f
+    
+    #priorities alone would evaluate c,b,a
+    a = Task(func("a"),1,0,"a")
+    b = Task(func("b"),1,1,"b",dependencies = "a")
+    c = Task(func("c"),1,2,"c",dependencies = ("a","b") )
+    d = Task(func("d"),1,1,"d",dependencies = "a")
+    e = Task(func("e"),2,3,"e")
+    for task in (a,b,c,d,e) :
+        scheduler.register(task,0)
+
+def test_graph () :
+    tasks = [Task(lambda : None,1,3,"e"),
+             Task(lambda : None,1,2,"c",("a","b") ),
+             Task(lambda : None,1,1,"b","a"),
+             Task(lambda : None,1,0,"a")]
+    order,pred = dependency_graph(tasks)
+    assert [tasks[i].name() for i in order] == ["e","a","b","c"]
+    assert sorted(pred[1]) == [2,3]
+    
+    #no dependencies, order unchanged
+    order,pred = dependency_graph([Task(lambda : None,1,0) for i in range(3)])
+    assert order == [0,1,2]
+
+def test_cyclic () :
+    tasks = [Task(lambda : None,1,0,"a","b"),Task(lambda : None,1,0,"b","a")]
+    try :
+        dependency_graph(tasks)
+        assert False
+    except ValueError :
+        pass
+
+def check_order (evaluated, nb_cycles) :
+    assert len(evaluated) == 4 * nb_cycles + (nb_cycles + 1) // 2
+    for cycle in range(nb_cycles) :
+        names = [name for cc,name in evaluated if cc == cycle]
+        pos = dict( (name,ind) for ind,name in enumerate(names) )
+        assert pos["a"] < pos["b"] < pos["c"]
+        assert pos["a"] < pos["d"]
+
+def test_serial () :
+    evaluated = []
+    s = Scheduler()
+    create_tasks(evaluated,s)
+    s.run_n(3)
+    check_order(evaluated,3)
+    #independent task keeps its priority
+    assert evaluated[0] == (0,"e")
+
+def test_executor () :
+    evaluated = []
+    with ThreadPoolExecutor(4) as executor :
+        s = Scheduler("wheel",executor)
+        create_tasks(evaluated,s)
+        assert s.run_n(4) == 4
+    
+    check_order(evaluated,4)
+
+def test_async () :
+    evaluated = []
+    s = AsyncScheduler()
+    create_tasks(evaluated,s)
+    asyncio.run(s.arun_until(3) )
+    check_order(evaluated,4)
+
+def test_unresolved_dependencies () :
+    #dependencies on unknown names keep the priority order
+    for executor in (None,ThreadPoolExecutor(2) ) :
+        evaluated = []
+        def func (name) :
+            def f () :
+                sleep(0.01 if name == "a" else 0)
+                evaluated.append(name)
+            return f
+        
+        s = Scheduler(executor = executor)
+        s.register(Task(func("a"),None,10,"a"),0)
+        s.register(Task(func("b"),None,0,"b"),0)
+        s.register(Task(func("c"),None,5,"c",dependencies = "unknown"),0)
+        s.run_n(1)
+        assert evaluated == ["a","c","b"]
+        if executor is not None :
+            executor.shutdown()
+
+def test_barriers () :
+    tasks = [Task(lambda : None,1,3,"a","c"),
+             Task(lambda : None,1,2,"b"),
+             Task(lambda : None,1,1,"c"),
+             Task(lambda : None,1,0,"d")]
+    order,pred = dependency_graph(tasks,[1,1,1,1])
+    #c is only linked to a, b and d keep the priority barriers
+    assert pred[0] == [2]
+    assert pred[1] == [0]
+    assert pred[2] == []
+    assert pred[3] == [1,2]
+    assert [tasks[i].name() for i in order] == ["c","a","b","d"]
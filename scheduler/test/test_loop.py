@@ -0,0 +1,83 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA  
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+# 
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+loop unit tests
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id"
+
+from time import monotonic
+from openalea.scheduler import Task,Scheduler,Loop,FixedRate,RealTime
+
+def create_scheduler (nb_steps, evaluated) :
+    def f () :
+        evaluated.append(len(evaluated) )
+    
+    class FiniteTask (Task) :
+        def evaluate (self) :
+            Task.evaluate(self)
+            if len(evaluated) < nb_steps :
+                return self._delay
+    
+    s = Scheduler()
+    s.register(FiniteTask(f,1,0),0)
+    return s
+
+def test_free_run () :
+    evaluated = []
+    loop = Loop(create_scheduler(1000,evaluated) )
+    t = monotonic()
+    loop.play()
+    assert loop.join(5.)
+    assert monotonic() - t < 5.
+    assert len(evaluated) == 1000
+    assert not loop.running()
+
+def test_pause () :
+    evaluated = []
+    loop = Loop(create_scheduler(10 ** 9,evaluated) )
+    loop.play()
+    assert not loop.join(0.05)
+    loop.pause()
+    assert not loop.running()
+    nb = len(evaluated)
+    assert nb > 0
+    assert len(evaluated) == nb
+    
+    #resume
+    loop.play()
+    loop.pause()
+    assert len(evaluated) >= nb
+
+def test_fixed_rate () :
+    evaluated = []
+    loop = Loop(create_scheduler(10,evaluated),pacing = FixedRate(100.) )
+    t = monotonic()
+    loop.play()
+    assert loop.join(5.)
+    assert monotonic() - t > 0.08
+
+def test_real_time () :
+    evaluated = []
+    s = create_scheduler(3,evaluated)
+    loop = Loop(s,pacing = RealTime(0.05) )
+    t = monotonic()
+    loop.play()
+    assert loop.join(5.)
+    assert monotonic() - t > 0.09
+    assert s.current_cycle() == 2
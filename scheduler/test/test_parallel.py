@@ -0,0 +1,74 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA  
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+# 
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+scheduler concurrent evaluation unit tests
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id"
+
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from openalea.scheduler import Task,Scheduler
+
+def create_scheduler (executor, evaluated) :
+    lock = Lock()
+    s = Scheduler(executor = executor)
+    for i in range(20) :
+        def func (i = i) :
+            with lock :
+                evaluated.append( (s.current_cycle(),i % 3) )
+        
+        s.register(Task(func,1 + i % 4,i % 3),0)
+    
+    return s
+
+def test_same_cycles () :
+    serial = []
+    s = create_scheduler(None,serial)
+    g = s.run()
+    ref = [next(g) for i in range(30)]
+    
+    concurrent = []
+    with ThreadPoolExecutor(4) as executor :
+        s = create_scheduler(executor,concurrent)
+        g = s.run()
+        res = [next(g) for i in range(30)]
+    
+    assert res == ref
+    #same (cycle,priority) sequence, only the order
+    #inside a priority group may change
+    assert concurrent == sorted(concurrent,key = lambda t : (t[0],-t[1]) )
+    assert sorted(concurrent) == sorted(serial)
+
+def test_exception () :
+    def fail () :
+        raise UserWarning("fail")
+    
+    def f () :
+        pass
+    
+    with ThreadPoolExecutor(2) as executor :
+        s = Scheduler(executor = executor)
+        s.register(Task(f,1,0),0)
+        s.register(Task(fail,1,0),0)
+        g = s.run()
+        try :
+            next(g)
+            assert False
+        except UserWarning :
+            pass
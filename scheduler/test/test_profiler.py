@@ -0,0 +1,97 @@
+# -*- python -*-
+#
+#       scheduler: simple scheduling of tasks
+#
+#       Copyright 2006 INRIA - CIRAD - INRA  
+#
+#       File author(s): Jerome Chopard <jerome.chopard@sophia.inria.fr>
+#                       Christophe Pradal <christophe.pradal@cirad.fr>
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+# 
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+
+"""
+profiler unit tests
+"""
+
+__license__= "Cecill-C"
+__revision__=" $Id"
+
+import json
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from openalea.scheduler import Task,Scheduler,Profiler
+
+def slow () :
+    sleep(0.002)
+
+def fast () :
+    pass
+
+def create_scheduler (executor = None) :
+    s = Scheduler(executor = executor)
+    s.register(Task(slow,2,0,"slow"),0)
+    s.register(Task(fast,1,0),0)
+    s.register(Task(fast,1,0),0)
+    return s
+
+def test_profiler () :
+    s = create_scheduler()
+    prof = Profiler(cycle_budget = 0.001)
+    s.set_profiler(prof)
+    g = s.run()
+    for i in range(10) :
+        next(g)
+    
+    stats = prof.task_stats()
+    assert [st["name"] for st in stats] == ["slow","fast","fast"]
+    assert stats[0]["calls"] == 5
+    assert stats[1]["calls"] == 10
+    assert stats[0]["p50"] >= 0.002
+    assert stats[0]["max"] >= stats[0]["p95"] >= stats[0]["p50"]
+    
+    assert len(prof.cycles() ) == 10
+    assert [cycle for cycle,duration in prof.overruns()] == [0,2,4,6,8]
+    
+    res = json.loads(prof.to_json() )
+    assert res["cycles"]["overruns"] == 5
+    assert "slow" in prof.table()
+
+def test_profiler_executor () :
+    with ThreadPoolExecutor(2) as executor :
+        s = create_scheduler(executor)
+        prof = Profiler()
+        s.set_profiler(prof)
+        g = s.run()
+        for i in range(4) :
+            next(g)
+    
+    assert sum(st["calls"] for st in prof.task_stats() ) == 10
+
+def test_disable () :
+    s = create_scheduler()
+    prof = Profiler()
+    s.set_profiler(prof)
+    g = s.run()
+    next(g)
+    s.set_profiler(None)
+    next(g)
+    assert len(prof.cycles() ) == 1
+
+def test_bounded_cycles () :
+    prof = Profiler(cycle_budget = 0.5,max_samples = 10)
+    for cycle in range(1000) :
+        prof.record_cycle(cycle,1. if cycle % 2 else 0.,3)
+    
+    assert len(prof.cycles() ) == 10
+    assert len(prof.overruns() ) == 10
+    assert prof.overruns()[-1] == (999,1.)
+    stats = prof.cycle_stats()
+    assert stats["cycles"] == 1000
+    assert stats["total"] == 500.
+    assert stats["max"] == 1.
+    assert stats["overruns"] == 500
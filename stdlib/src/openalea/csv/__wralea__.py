@@ -17,7 +17,7 @@ __doc__ = """ OpenAlea.file.CSV """
 __revision__ = " $Id$ "
 
 from openalea.core import Factory as Fa
-from openalea.core import Alias, IStr
+from openalea.core import Alias, IBool, IFileStr, IInt, IStr
 from openalea.core.pkgdict import protected
 
 __name__ = "openalea.file.csv"
@@ -30,7 +30,7 @@ __institutes__ = 'INRIA/CIRAD'
 __description__ = 'Csv Node library.'
 __url__ = 'http://openalea.gforge.inria.fr'
 
-__all__ = ['read_csv', 'write_csv']
+__all__ = ['read_csv', 'write_csv', 'write_csv_file', 'read_rows']
 
 read_csv = Fa(uid="718d331e4e5611e6bff6d4bed973e64a",
               name='read csv',
@@ -55,3 +55,41 @@ write_csv = Fa(uid="76ed920e4e5611e6bff6d4bed973e64a",
                outputs=(dict(name='string', interface=IStr),)
                )
 Alias(write_csv, 'obj2csv')
+
+write_csv_file = Fa(uid="3b7e52a08c0a11efb5a0d4bed973e64a",
+                    name='write csv file',
+                    description='Csv exporter writing rows to a file',
+                    category='io',
+                    nodemodule='openalea.csv.csv',
+                    nodeclass='writeObjsToFile',
+                    lazy=False,
+                    inputs=(dict(name='objects', interface=None),
+                            dict(name='filename', interface=IFileStr),
+                            dict(name='header', interface=None, value=None,
+                                 desc='fields to write, all if None'),
+                            dict(name='separator', interface=IStr,
+                                 value=','),
+                            dict(name='lineseparator', interface=IStr,
+                                 value='\n'),),
+                    outputs=(dict(name='filename', interface=IFileStr),)
+                    )
+
+read_rows = Fa(uid="9e4c1f6a8c2b11efb5a0d4bed973e64a",
+               name='read rows',
+               description=('Read a range of rows of a large csv file, '
+                            'using an index of row offsets'),
+               category='io',
+               nodemodule='openalea.csv.rowindex',
+               nodeclass='read_rows',
+               lazy=False,
+               inputs=(dict(name='filename', interface=IFileStr),
+                       dict(name='start', interface=IInt, value=0),
+                       dict(name='stop', interface=None, value=None,
+                            desc='None for the last row'),
+                       dict(name='delimiter', interface=IStr, value=','),
+                       dict(name='header', interface=IBool, value=False),
+                       dict(name='step', interface=IInt(min=1), value=1000,
+                            desc='one row out of step is indexed'),),
+               outputs=(dict(name='rows', interface=None),
+                        dict(name='header', interface=None),)
+               )
@@ -16,6 +16,14 @@
 __license__ = "Cecill-C"
 __revision__ = " $Id$ "
 
+import io
+import locale
+import os
+
+from .table import Table, concatenate_columns, typed_column
+
+DEFAULT_CHUNK_SIZE = 1 << 26
+
 
 class Obj(object):
 
@@ -49,18 +57,9 @@ class Obj(object):
         return propname.union(set(self.__dict__.keys()))
 
     def write(self, propnames, separator=','):
-        res = ''
-        nbprop = len(propnames)
-        for i, prop in enumerate(propnames):
-            if hasattr(self, prop):
-                v = self.__dict__[prop]
-                if type(v) == str:
-                    res += '"'+v+'"'
-                else:
-                    res += str(v)
-            if i < nbprop-1:
-                res += separator
-        return res
+        d = self.__dict__
+        return separator.join(format_value(d[prop]) if hasattr(self, prop)
+                              else '' for prop in propnames)
 
     def __repr__(self):
         res = 'Obj('
@@ -77,7 +76,9 @@ class Obj(object):
         return res
 
 
-def read_csv_from_file(filename=None, delimiter=' ', header=False):
+def read_csv_from_file(filename=None, delimiter=' ', header=False,
+                       typed=False, N=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                       cache=False):
     """Read CSV file
 
     This function reads a CSV file (see format information below).
@@ -94,6 +95,10 @@ def read_csv_from_file(filename=None, delimiter=' ', header=False):
     `filename` - input filename of a valid CSV file
     `delimiter` delimiter such as ',', ' ', ';'
     `header` - boolean to skip the first line (header)
+    `typed` - convert columns to int or float arrays (see below)
+    `N` - number of processes parsing chunks of the file, 0 for all cpus
+    `chunk_size` - size in bytes of the chunks read by each process
+    `cache` - keep the typed columns in a binary file next to the CSV file
 
 
     :Returns:
@@ -102,6 +107,20 @@ def read_csv_from_file(filename=None, delimiter=' ', header=False):
 
         `list` is header=False, `dict` is header=True
 
+    If typed is True or N is not 1, the file is split at line boundaries
+    in chunks of about chunk_size bytes, parsed by N processes and
+    the returned csv_header is None. With typed, values are a dict
+    {name or column index: column}, each column being an array of
+    ints, floats (NaN for empty cells) or strings (see
+    table.typed_column).
+    Fields holding line breaks inside quotes are not supported in this
+    mode. See iter_csv_chunks for files larger than memory.
+
+    With cache (which implies typed), the columns are stored in a
+    `.npycache` directory next to the file (see sidecar) and memory
+    mapped by the next calls, as long as the size and modification
+    time of the file do not change. Cached arrays are read-only.
+
     :Format Information:
 
     While there are various specifications and implementations for the
@@ -135,8 +154,12 @@ def read_csv_from_file(filename=None, delimiter=' ', header=False):
         T. Cokelaer
 
     """
-    from . import csv
+    import csv
     from os import path
+    if path.exists(filename) and (typed or cache or N != 1):
+        return (None, read_csv_chunks(filename, delimiter, header,
+                                      typed or cache, N, chunk_size,
+                                      cache=cache))
     if path.exists(filename):
         csv_data = csv.reader(open(filename), delimiter=delimiter)
     else:
@@ -158,9 +181,194 @@ def read_csv_from_file(filename=None, delimiter=' ', header=False):
     return (csv_data, res)
 
 
-def parseText(text = '', separator=',', lineseparator='\n'):
+def _read_header(filename, delimiter, encoding):
+    """ Fields of the first line and the offset of the second one. """
+    import csv
+    with open(filename, 'rb') as f:
+        line = f.readline()
+        start = f.tell()
+    fields = next(csv.reader([line.decode(encoding).rstrip('\r\n')],
+                             delimiter=delimiter), [])
+    return fields, start
+
+
+def line_ranges(filename, chunk_size=DEFAULT_CHUNK_SIZE, start=0):
+    """ Byte ranges of a file cut at line ends.
+
+    :returns: list of (start, stop) of chunks of about chunk_size bytes,
+              each holding whole lines
+    """
+    size = os.path.getsize(filename)
+    chunk_size = max(1, int(chunk_size))
+    ranges = []
+    with open(filename, 'rb') as f:
+        while start < size:
+            stop = start + chunk_size
+            if stop < size:
+                # end of the line holding the last byte of the chunk
+                f.seek(stop - 1)
+                f.readline()
+                stop = f.tell()
+            stop = min(stop, size)
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+
+def _parse_range(filename, start, stop, delimiter, encoding, columns, typed):
+    """ Parse lines of a byte range of a file.
+
+    :returns: the list of rows if columns is False, otherwise the list
+              of columns, typed (see table.typed_column) or not
+              (lists of strings)
+    """
+    import csv
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        text = f.read(stop - start).decode(encoding)
+    reader = csv.reader(io.StringIO(text, newline=''), delimiter=delimiter)
+    if not columns:
+        return list(reader)
+
+    cols = []
+    for row in reader:
+        if len(row) > len(cols):
+            cols.extend([] for i in range(len(row) - len(cols)))
+        for col, x in zip(cols, row):
+            col.append(x)
+    if typed:
+        cols = [typed_column(col) for col in cols]
+    return cols
+
+
+def _parse_args(filename, delimiter, header, typed, chunk_size, encoding):
+    """ Fields and arguments of _parse_range for each chunk. """
+    encoding = encoding or locale.getpreferredencoding(False)
+    fields, start = None, 0
+    if header:
+        fields, start = _read_header(filename, delimiter, encoding)
+    columns = bool(header or typed)
+    args = [(filename, begin, end, delimiter, encoding, columns, typed)
+            for begin, end in line_ranges(filename, chunk_size, start)]
+    return fields, args
+
+
+def _string_columns(chunks, args):
+    """ Give the same type to a column in all typed chunks.
+
+    A column is inferred as numbers in some chunks and as strings in
+    others (e.g. '007' then 'A7'): the numeric chunks are parsed again
+    and their raw strings kept, as when parsing the file in one chunk.
+    """
+    strings = set()
+    for cols in chunks:
+        strings.update(i for i, col in enumerate(cols)
+                       if getattr(col, 'dtype', None) is not None
+                       and col.dtype.kind == 'U')
+    if not strings:
+        return chunks
+
+    import numpy
+    res = []
+    for cols, a in zip(chunks, args):
+        redo = [i for i in strings if i < len(cols)
+                and cols[i].dtype.kind != 'U']
+        if redo:
+            cols = list(cols)
+            raw = _parse_range(*a[:-1], typed=False)
+            for i in redo:
+                cols[i] = numpy.array(raw[i], dtype=str)
+        res.append(cols)
+    return res
+
+
+def _merge(fields, chunks, typed):
+    """ Result of read_csv_from_file from the results of _parse_range. """
+    if fields is None and not typed:
+        return [row for rows in chunks for row in rows]
+
+    nbcols = max([len(cols) for cols in chunks] + [0])
+    if fields is not None:
+        nbcols = len(fields)
+    res = {}
+    for i in range(nbcols):
+        parts = [cols[i] for cols in chunks if i < len(cols)]
+        name = fields[i] if fields is not None else i
+        if typed:
+            res[name] = concatenate_columns(parts)
+        else:
+            res[name] = [x for part in parts for x in part]
+    return res
+
+
+def read_csv_chunks(filename, delimiter=' ', header=False, typed=False,
+                    N=1, chunk_size=DEFAULT_CHUNK_SIZE, encoding=None,
+                    cache=False):
+    """Parse a CSV file by chunks of lines, in N processes.
+
+    See read_csv_from_file, which returns the same values.
+    """
+    if cache and typed:
+        from . import sidecar
+        options = {'delimiter': delimiter, 'header': bool(header),
+                   'encoding': encoding or locale.getpreferredencoding(False)}
+        try:
+            res = sidecar.load_columns(filename, options)
+        except ImportError:
+            cache = False
+        else:
+            if res is not None:
+                return res
+
+    fields, args = _parse_args(filename, delimiter, header, typed,
+                               chunk_size, encoding)
+    if N == 1 or len(args) < 2:
+        chunks = [_parse_range(*a) for a in args]
+    else:
+        from openalea.multiprocessing.pool import get_pool, pool_starmap
+        chunks = pool_starmap(get_pool(N), _parse_range, args)
+    if typed and len(chunks) > 1:
+        chunks = _string_columns(chunks, args)
+    res = _merge(fields, chunks, typed)
+
+    if cache and typed:
+        sidecar.save_columns(filename, options, res)
+    return res
+
+
+def iter_csv_chunks(filename, delimiter=' ', header=False, typed=False,
+                    chunk_size=DEFAULT_CHUNK_SIZE, encoding=None):
+    """Iterator on the chunks of a CSV file, for files larger than memory.
+
+    Each chunk holds the whole lines of about chunk_size bytes, in the
+    format of read_csv_from_file: a list of rows, or a dict of columns
+    if header or typed is True.
+    """
+    fields, args = _parse_args(filename, delimiter, header, typed,
+                               chunk_size, encoding)
+    for a in args:
+        yield _merge(fields, [_parse_range(*a)], typed)
+
+
+def format_value(v):
+    """ Text of a value in a CSV file: strings are quoted. """
+    if type(v) == str:
+        return '"'+v+'"'
+    return str(v)
+
+
+def parseText(text = '', separator=',', lineseparator='\n', columnar=False):
+    """Parse CSV text with a header line.
+
+    :returns: the list of Obj (one per row) or, if columnar is True,
+              a Table (see table) whose rows give the same access,
+              and the header
+    """
     lines = text.split(lineseparator)
     propname = lines.pop(0).split(separator)
+    if columnar:
+        return (Table.from_lines(propname, lines, separator), propname)
+
     objList = []
     for i, l in enumerate(lines):
         values = l.split(separator)
@@ -171,21 +379,70 @@ def parseText(text = '', separator=',', lineseparator='\n'):
     return (objList, propname)
 
 
-def writeObjs(objects, separator=',', lineseparator='\n'):
-    res = ''
+def merge_headers(objects):
+    """ Set of the fields of all objects. """
     propnames = set()
     for obj in objects:
         propnames = obj.merge_header(propnames)
-    nbprop = len(propnames)
-    for i, prop in enumerate(propnames):
-        if type(prop) == str:
-            res += '"'+prop+'"'
-        else:
-            res += str(prop)
-        if i < nbprop -1:
-            res += separator
-    res += lineseparator
+    return propnames
+
+
+def header_line(propnames, separator=','):
+    return separator.join(format_value(prop) for prop in propnames)
+
+
+def write_objs(objects, stream, header=None, separator=',',
+               lineseparator='\n', buffer_size=1000):
+    """Write objects in CSV format to a stream, row by row.
+
+    The output is the same as writeObjs. Rows are written by
+    blocks of `buffer_size` lines, so the whole text is never held
+    in memory.
+
+    :param objects: iterable on Obj (or Row of a Table)
+    :param stream: file object opened in text mode
+    :param header: list of fields to write, in order. If None,
+                   the union of the fields of all objects is used,
+                   which needs a first pass on them.
+    :returns: the number of objects written
+    """
+    if header is None:
+        objects = list(objects)
+        header = merge_headers(objects)
+    elif isinstance(header, str):
+        header = header.split(separator)
+
+    stream.write(header_line(header, separator) + lineseparator)
+    nb = 0
+    lines = []
     for obj in objects:
-        res += obj.write(propnames, separator)
-        res += lineseparator
-    return (res, )
+        lines.append(obj.write(header, separator))
+        nb += 1
+        if len(lines) >= buffer_size:
+            lines.append('')
+            stream.write(lineseparator.join(lines))
+            lines = []
+    if lines:
+        lines.append('')
+        stream.write(lineseparator.join(lines))
+    return nb
+
+
+def writeObjsToFile(objects, filename, header=None, separator=',',
+                    lineseparator='\n'):
+    """Write objects in a CSV file, without building the whole text.
+
+    See write_objs. A header (list of fields, or a line of field names)
+    avoids a first pass on objects to compute it.
+    """
+    with open(filename, 'w', newline='') as f:
+        write_objs(objects, f, header, separator, lineseparator)
+    return (filename, )
+
+
+def writeObjs(objects, separator=',', lineseparator='\n'):
+    propnames = merge_headers(objects)
+    lines = [header_line(propnames, separator)]
+    lines.extend(obj.write(propnames, separator) for obj in objects)
+    lines.append('')
+    return (lineseparator.join(lines), )
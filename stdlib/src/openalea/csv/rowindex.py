@@ -0,0 +1,193 @@
+# -*- python -*-
+#
+#       OpenAlea.StdLib
+#
+#       Copyright 2006-2023 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Random access to the rows of large CSV files.
+
+The index of `data.csv` is stored next to it in `data.csv.rowidx`:
+a line of JSON (size and modification time of the CSV file, options,
+number of rows) followed by the byte offsets of every `step`-th row.
+Reading rows start to stop only reads the lines from the closest
+indexed row before start.
+
+Rows are lines: fields holding line breaks inside quotes are not
+supported.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import json
+import locale
+import os
+import sys
+from array import array
+from itertools import islice
+
+SUFFIX = '.rowidx'
+VERSION = 1
+DEFAULT_STEP = 1000
+
+
+def index_path(filename):
+    """ File holding the row index of a CSV file. """
+    return os.path.abspath(filename) + SUFFIX
+
+
+def _key(filename, step, header):
+    st = os.stat(filename)
+    return {'version': VERSION,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'step': step,
+            'header': bool(header)}
+
+
+class RowIndex(object):
+    """ Byte offsets of every step-th row of a CSV file. """
+
+    def __init__(self, key, offsets, nb_rows, header_offset=0):
+        """
+        :param key: size, mtime and options of the indexed file
+        :param offsets: array('Q') of offsets of rows 0, step, 2*step...
+        :param nb_rows: number of rows (without header)
+        :param header_offset: offset of the first row
+        """
+        self.key = key
+        self.offsets = offsets
+        self.nb_rows = nb_rows
+        self.header_offset = header_offset
+
+    @property
+    def step(self):
+        return self.key['step']
+
+    @classmethod
+    def build(cls, filename, step=DEFAULT_STEP, header=False):
+        """ Index a file, reading it once. """
+        key = _key(filename, step, header)
+        offsets = array('Q')
+        nb_rows = 0
+        with open(filename, 'rb') as f:
+            pos = len(f.readline()) if header else 0
+            header_offset = pos
+            f.seek(pos)
+            while True:
+                lines = list(islice(f, step))
+                if not lines:
+                    break
+                offsets.append(pos)
+                pos += sum(map(len, lines))
+                nb_rows += len(lines)
+        return cls(key, offsets, nb_rows, header_offset)
+
+    def save(self, filename):
+        """ Store the index next to the CSV file.
+
+        :returns: False if it can not be written
+        """
+        meta = {'key': self.key, 'nb_rows': self.nb_rows,
+                'header_offset': self.header_offset}
+        offsets = self.offsets
+        if sys.byteorder != 'little':
+            offsets = array('Q', offsets)
+            offsets.byteswap()
+        path = index_path(filename)
+        tmp = '%s.tmp%d' % (path, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(json.dumps(meta).encode('ascii') + b'\n')
+                offsets.tofile(f)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+    @classmethod
+    def load(cls, filename, step=DEFAULT_STEP, header=False):
+        """ Stored index of a file, None if missing or out of date. """
+        try:
+            with open(index_path(filename), 'rb') as f:
+                meta = json.loads(f.readline().decode('ascii'))
+                if meta['key'] != _key(filename, step, header):
+                    return None
+                offsets = array('Q')
+                offsets.frombytes(f.read())
+        except (OSError, ValueError, KeyError):
+            return None
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        return cls(meta['key'], offsets, meta['nb_rows'],
+                   meta['header_offset'])
+
+    def offset(self, row):
+        """ Offset of the closest indexed row before row, and its number. """
+        k = row // self.step
+        return self.offsets[k], k * self.step
+
+
+def get_index(filename, step=DEFAULT_STEP, header=False):
+    """ Index of a file, built and stored if it is missing or stale. """
+    index = RowIndex.load(filename, step, header)
+    if index is None:
+        index = RowIndex.build(filename, step, header)
+        index.save(filename)
+    return index
+
+
+def read_rows(filename, start=0, stop=None, delimiter=',', header=False,
+              step=DEFAULT_STEP, encoding=None):
+    """Read rows start to stop (excluded) of a CSV file.
+
+    Only the lines from the closest indexed row are read (see
+    get_index, the index is built on first use).
+
+    :Parameters:
+
+    `filename` - CSV file
+    `start`, `stop` - numbers of the rows, as in a slice (negative
+        values count from the end, stop None for the last row)
+    `delimiter` - field delimiter
+    `header` - if True, the first line holds the fields names and
+        is not counted as a row
+    `step` - one row out of step is indexed
+
+    :Returns:
+
+        the list of rows (lists of strings) and the fields names
+        (None if header is False)
+    """
+    import csv
+    encoding = encoding or locale.getpreferredencoding(False)
+    index = get_index(filename, step, header)
+    start, stop, _ = slice(start, stop).indices(index.nb_rows)
+
+    fields = None
+    rows = []
+    with open(filename, 'rb') as f:
+        if header:
+            line = f.readline().decode(encoding)
+            fields = next(csv.reader([line], delimiter=delimiter), [])
+        if start < stop:
+            offset, row = index.offset(start)
+            f.seek(offset)
+            lines = islice(f, start - row, stop - row)
+            rows = list(csv.reader((l.decode(encoding) for l in lines),
+                                   delimiter=delimiter))
+    return (rows, fields)
+
+
+def count_rows(filename, header=False, step=DEFAULT_STEP):
+    """ Number of rows of a CSV file, from its index. """
+    return get_index(filename, step, header).nb_rows
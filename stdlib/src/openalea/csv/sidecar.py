@@ -0,0 +1,107 @@
+# -*- python -*-
+#
+#       OpenAlea.StdLib
+#
+#       Copyright 2006-2023 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Binary cache of the typed columns of CSV files.
+
+The columns parsed from `data.csv` are stored next to it in the
+`data.csv.npycache` directory, one `.npy` file per column plus a
+`meta.json` file recording the size and modification time of the CSV
+file and the parsing options. Later loads of an unchanged file memory
+map the columns instead of parsing the text again.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import json
+import os
+import shutil
+
+SUFFIX = '.npycache'
+META = 'meta.json'
+VERSION = 1
+
+
+def sidecar_path(filename):
+    """ Directory holding the cached columns of a CSV file. """
+    return os.path.abspath(filename) + SUFFIX
+
+
+def _key(filename, options):
+    st = os.stat(filename)
+    return {'version': VERSION,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'options': options}
+
+
+def load_columns(filename, options):
+    """ Cached columns of a CSV file, None if missing or out of date.
+
+    :param options: dict of the parsing options (json types)
+    :returns: dict {name: read-only memory mapped array}, in the
+              order of the file
+    """
+    import numpy
+    directory = sidecar_path(filename)
+    try:
+        with open(os.path.join(directory, META)) as f:
+            meta = json.load(f)
+        if meta['key'] != _key(filename, options):
+            return None
+        res = {}
+        for i, name in enumerate(meta['names']):
+            path = os.path.join(directory, '%d.npy' % i)
+            if meta['objects'][i]:
+                # object arrays can not be memory mapped
+                res[name] = numpy.load(path, allow_pickle=True)
+            else:
+                res[name] = numpy.load(path, mmap_mode='r')
+        return res
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_columns(filename, options, columns):
+    """ Store the columns parsed from a CSV file.
+
+    Columns must be arrays. Nothing is stored (and False returned)
+    if the directory of the file is not writable.
+    """
+    import numpy
+    directory = sidecar_path(filename)
+    tmp = '%s.tmp%d' % (directory, os.getpid())
+    try:
+        key = _key(filename, options)
+        os.makedirs(tmp, exist_ok=True)
+        names, objects = [], []
+        for i, (name, col) in enumerate(columns.items()):
+            col = numpy.asarray(col)
+            numpy.save(os.path.join(tmp, '%d.npy' % i), col,
+                       allow_pickle=col.dtype == object)
+            names.append(name)
+            objects.append(col.dtype == object)
+        with open(os.path.join(tmp, META), 'w') as f:
+            json.dump({'key': key, 'names': names, 'objects': objects}, f)
+
+        clear(filename)
+        os.rename(tmp, directory)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+    return True
+
+
+def clear(filename):
+    """ Remove the cached columns of a CSV file. """
+    shutil.rmtree(sidecar_path(filename), ignore_errors=True)
@@ -0,0 +1,441 @@
+# -*- python -*-
+#
+#       OpenAlea.StdLib
+#
+#       Copyright 2006-2023 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+###############################################################################
+"""Columnar tables of CSV data.
+
+A Table stores one typed column per field (a NumPy array when NumPy is
+available, a list otherwise) instead of one object per row. The type of
+a column is inferred once for the whole column: int, then float, and
+for mixed columns each cell is converted as `csv.Obj` does. Float
+columns record the cells written as ints, which rows give as ints.
+Rows are light views giving the same `row[key]` and `row.key` access
+as `csv.Obj`.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def convert_value(val):
+    """ int, float or str value of a cell, as csv.Obj does. """
+    try:
+        return int(val)
+    except ValueError:
+        try:
+            return float(val)
+        except ValueError:
+            return str(val)
+
+
+# ints below are exact in float64
+_MAX_EXACT = 2 ** 53
+
+
+def _int_cells(numpy, arr):
+    """ Mask of the numbers of a string array written as ints. """
+    ints = numpy.ones(len(arr), dtype=bool)
+    # decimal point, exponent, nan and inf
+    for char in '.eEnNiI':
+        ints &= numpy.char.find(arr, char) < 0
+    return ints
+
+
+def convert_column(cells):
+    """ Typed values of a column of non empty cells.
+
+    :returns: the values and the mask of the ints in a float array
+              (None if there is none). Values are an int64 or float64
+              array if NumPy is available and all cells are ints or
+              floats, a list of converted values otherwise
+    """
+    numpy = _numpy()
+    if numpy is not None:
+        arr = numpy.array(cells, dtype=str)
+        try:
+            return arr.astype(numpy.int64), None
+        except OverflowError:
+            # python ints are not bounded
+            pass
+        except ValueError:
+            try:
+                values = arr.astype(numpy.float64)
+            except ValueError:
+                return [convert_value(v) for v in cells], None
+            ints = _int_cells(numpy, arr)
+            if not ints.any():
+                return values, None
+            if (numpy.abs(values[ints]) < _MAX_EXACT).all():
+                return values, ints
+
+    try:
+        return list(map(int, cells)), None
+    except ValueError:
+        return [convert_value(v) for v in cells], None
+
+
+def typed_column(cells):
+    """ Array of the cells of a column, as typed as possible.
+
+    Without NumPy, see convert_column (None where cells are empty).
+
+    :returns: an int64 array, a float64 array (empty cells are NaN) or
+              an array of strings if some cells are not numbers
+    """
+    numpy = _numpy()
+    if numpy is None:
+        return Column.from_cells(cells).as_values()
+
+    arr = numpy.array(cells, dtype=str)
+    empty = arr == ''
+    if empty.any():
+        res = numpy.full(len(arr), numpy.nan)
+        try:
+            res[~empty] = arr[~empty].astype(numpy.float64)
+        except ValueError:
+            return arr
+        return res
+
+    for dtype in (numpy.int64, numpy.float64):
+        try:
+            return arr.astype(dtype)
+        except (ValueError, OverflowError):
+            pass
+    return arr
+
+
+def concatenate_columns(parts):
+    """ Column of the values of several typed_column results.
+
+    Parts holding strings for a column where others hold numbers must
+    have been parsed again as strings (see csv.read_csv_chunks), the
+    result would depend on how the column was split otherwise.
+    """
+    numpy = _numpy()
+    if numpy is None or not all(isinstance(p, numpy.ndarray) for p in parts):
+        return [x for p in parts for x in p]
+    if not parts:
+        return numpy.array([], dtype=str)
+    try:
+        return numpy.concatenate(parts)
+    except (TypeError, ValueError):
+        # numbers in some parts, strings in others
+        return numpy.concatenate([p.astype(object) for p in parts])
+
+
+class Column(object):
+    """ Values of a field and the rows where it is missing.
+
+    Cells written as ints in a float column are floats in the values
+    array but ints for rows, as they are for csv.Obj.
+    """
+
+    def __init__(self, values, missing=None, ints=None):
+        """
+        :param values: array or list of values, one per row
+        :param missing: None or list of booleans, True for rows
+                        without value (empty cells)
+        :param ints: None or boolean array, True for rows of a float
+                     array whose value is an int
+        """
+        self.values = values
+        self.missing = missing
+        self.ints = ints
+
+    @classmethod
+    def from_cells(cls, cells):
+        """ Column of strings, empty ones are missing. """
+        missing = [len(c) == 0 for c in cells]
+        if not any(missing):
+            values, ints = convert_column(cells)
+            return cls(values, None, ints)
+
+        present = [c for c in cells if c]
+        converted, ints = convert_column(present)
+        numpy = _numpy()
+        if numpy is not None:
+            missing = numpy.array(missing, dtype=bool)
+        if numpy is not None and isinstance(converted, numpy.ndarray):
+            values = numpy.zeros(len(cells), converted.dtype)
+            values[~missing] = converted
+            if ints is not None:
+                present_ints, ints = ints, numpy.zeros(len(cells), bool)
+                ints[~missing] = present_ints
+        else:
+            values = [None] * len(cells)
+            it = iter(converted)
+            for i, miss in enumerate(missing):
+                if not miss:
+                    values[i] = next(it)
+        return cls(values, missing, ints)
+
+    def _int_rows(self, numpy):
+        """ Mask of the rows holding ints, for an array of values. """
+        if self.values.dtype.kind in 'iu':
+            return numpy.ones(len(self), dtype=bool)
+        if self.ints is None:
+            return numpy.zeros(len(self), dtype=bool)
+        return self.ints
+
+    @classmethod
+    def concatenate(cls, columns):
+        """ Column of the rows of several columns.
+
+        Int and float arrays give a float array (ints are still ints
+        for rows), a column holding strings gives a list.
+        """
+        if len(columns) == 1:
+            return columns[0]
+
+        numpy = _numpy()
+        ints = None
+        arrays = numpy is not None and all(
+            isinstance(c.values, numpy.ndarray) for c in columns)
+        if arrays:
+            values = numpy.concatenate([c.values for c in columns])
+            if values.dtype.kind == 'f':
+                ints = numpy.concatenate([c._int_rows(numpy)
+                                          for c in columns])
+                if not ints.any():
+                    ints = None
+                elif (numpy.abs(values[ints]) >= _MAX_EXACT).any():
+                    # ints not exact as floats
+                    arrays = False
+        if not arrays:
+            ints = None
+            values = []
+            for c in columns:
+                values.extend(c.as_list())
+
+        if all(c.missing is None for c in columns):
+            return cls(values, None, ints)
+        missing = [[False] * len(c) if c.missing is None else c.missing
+                   for c in columns]
+        if numpy is not None:
+            missing = numpy.concatenate(missing).astype(bool)
+        else:
+            missing = [miss for m in missing for miss in m]
+        return cls(values, missing, ints)
+
+    def __len__(self):
+        return len(self.values)
+
+    def has_value(self, i):
+        return self.missing is None or not self.missing[i]
+
+    def as_values(self):
+        """ The values array or list, or a list with None where missing. """
+        if self.missing is None:
+            return self.values
+        return [self.get(i) if self.has_value(i) else None
+                for i in range(len(self))]
+
+    def as_list(self):
+        """ List of the python values of the rows (filler values where
+        missing). """
+        values = self.values
+        if not hasattr(values, 'tolist'):
+            return list(values)
+        values = values.tolist()
+        if self.ints is not None:
+            for i in self.ints.nonzero()[0]:
+                values[i] = int(values[i])
+        return values
+
+    def get(self, i):
+        """ Python value of row i. Raises KeyError if it is missing. """
+        if not self.has_value(i):
+            raise KeyError(i)
+        val = self.values[i]
+        if self.ints is not None and self.ints[i]:
+            return int(val)
+        # numpy scalars are returned as python values, like Obj
+        return val.item() if hasattr(val, 'item') else val
+
+
+class Row(object):
+    """ View on a row of a Table.
+
+    Fields are read as items or attributes, like csv.Obj. Missing
+    fields raise AttributeError, as they are not set on an Obj.
+    """
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        object.__setattr__(self, '_table', table)
+        object.__setattr__(self, '_index', index)
+
+    def __reduce__(self):
+        return (Row, (self._table, self._index))
+
+    def __getattr__(self, key):
+        # private names (e.g. looked up by pickle or copy on a row
+        # whose slots are not set yet) are not fields
+        if key.startswith('_'):
+            raise AttributeError(key)
+        return self._field(key)
+
+    def _field(self, key):
+        table = self._table
+        column = table.columns.get(key)
+        if column is not None and column.has_value(self._index):
+            return column.get(self._index)
+        if key == 'pid':
+            return table.pids[self._index]
+        raise AttributeError(key)
+
+    def __setattr__(self, key, val):
+        raise AttributeError('rows of a Table are read only, '
+                             'use Table.to_objs to modify them')
+
+    def __getitem__(self, key):
+        return self._field(key)
+
+    def as_dict(self):
+        """ Fields of the row, in the order of Obj.__dict__. """
+        d = {'pid': self.pid}
+        i = self._index
+        for name, column in self._table.columns.items():
+            if column.has_value(i):
+                d[name] = column.get(i)
+        return d
+
+    def merge_header(self, propname):
+        return propname.union(set(self.as_dict().keys()))
+
+    def write(self, propnames, separator=','):
+        from .csv import format_value
+        d = self.as_dict()
+        return separator.join(format_value(d[prop]) if prop in d else ''
+                              for prop in propnames)
+
+    def __repr__(self):
+        return 'Row(' + ','.join(str(key) + '=' + str(val)
+                                 for key, val in self.as_dict().items()) + ')'
+
+
+class Table(object):
+    """ Columnar table of CSV data.
+
+    Iterating or indexing with an int gives Row views, indexing with
+    a field name gives the values of its column.
+    """
+
+    def __init__(self, names, columns, pids):
+        """
+        :param names: field names, in the order of the header
+        :param columns: dict {name: Column}
+        :param pids: row ids (line numbers after the header)
+        """
+        self.names = list(names)
+        self.columns = columns
+        self.pids = pids
+
+    @classmethod
+    def from_rows(cls, propnames, rows, pids=None):
+        """ Table of rows of strings (rows have len(propnames) cells). """
+        names = [prop.replace('"', '') for prop in propnames]
+        if pids is None:
+            pids = list(range(1, len(rows) + 1))
+        cells = list(zip(*rows)) if rows else [()] * len(names)
+        columns = {}
+        for name, col in zip(names, cells):
+            # as with Obj, the last field of a given name is kept
+            columns[name] = Column.from_cells(col)
+        return cls(names, columns, pids)
+
+    @classmethod
+    def from_lines(cls, propnames, lines, separator=',', chunksize=65536):
+        """ Table of lines of text, as parsed by csv.parseText.
+
+        Lines without one cell per field are skipped. Lines are
+        converted by chunks, so that only the cells of one chunk
+        are held as strings.
+
+        :param lines: iterable on the lines following the header
+        """
+        nbprop = len(propnames)
+        tables = []
+        rows, pids = [], []
+        for i, line in enumerate(lines):
+            values = line.split(separator)
+            if len(values) == nbprop:
+                rows.append(values)
+                pids.append(i + 1)
+                if len(rows) >= chunksize:
+                    tables.append(cls.from_rows(propnames, rows, pids))
+                    rows, pids = [], []
+        if rows or not tables:
+            tables.append(cls.from_rows(propnames, rows, pids))
+        return cls.concatenate(tables)
+
+    @classmethod
+    def concatenate(cls, tables):
+        """ Table of the rows of tables with the same fields. """
+        if len(tables) == 1:
+            return tables[0]
+        first = tables[0]
+        columns = dict((name, Column.concatenate([t.columns[name]
+                                                  for t in tables]))
+                       for name in first.columns)
+        pids = [pid for t in tables for pid in t.pids]
+        return cls(first.names, columns, pids)
+
+    def __len__(self):
+        return len(self.pids)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Row(self, i)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.column(key)
+        if isinstance(key, slice):
+            return [Row(self, i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        return Row(self, key)
+
+    def column(self, name):
+        """ Values of a field: an array or a list, None where missing.
+
+        Ints of a float column are floats in the array.
+        """
+        return self.columns[name].as_values()
+
+    def rows(self):
+        """ List of Row views. """
+        return list(self)
+
+    def to_objs(self):
+        """ List of csv.Obj, as returned by parseText. """
+        from .csv import Obj
+        objs = []
+        for row in self:
+            obj = Obj.__new__(Obj)
+            obj.__dict__.update(row.as_dict())
+            objs.append(obj)
+        return objs
+
+    def __repr__(self):
+        return 'Table(%d rows: %s)' % (len(self), ', '.join(self.names))
@@ -16,7 +16,7 @@ __doc__ = """ openalea.function operator """
 __revision__ = " $Id$ "
 
 from openalea.core import Factory as Fa
-from openalea.core import IBool, IFunction, ISequence, IStr
+from openalea.core import IBool, IFunction, IInt, ISequence, IStr
 
 __name__ = "openalea.function operator"
 
@@ -29,14 +29,16 @@ __institutes__ = 'INRIA/CIRAD'
 __description__ = 'Functional Node library.'
 __url__ = 'http://openalea.gforge.inria.fr'
 
-__all__ = ['map_', 'filter_', 'reduce_', 'apply_', 'func', 'ifelse_']
+__all__ = ['map_', 'filter_', 'reduce_', 'apply_', 'func', 'ifelse_',
+           'imap_', 'ifilter_', 'ireduce_', 'islice_', 'chain_', 'batched_']
 
 map_ = Fa(uid="d68a1fc64e7311e6bff6d4bed973e64a",
           name="map",
           description="Apply a function on a sequence",
           category="Functional",
           inputs=(dict(name='func', interface=IFunction),
-                  dict(name='seq', interface=ISequence),),
+                  dict(name='seq', interface=ISequence),
+                  dict(name='vectorize', interface=IBool, value=False),),
           outputs=(dict(name="out", interface=ISequence),),
           nodemodule="openalea.functional.functional",
           nodeclass="pymap",
@@ -102,3 +104,75 @@ ifelse_ = Fa(uid="eeb2d4e44e7311e6bff6d4bed973e64a",
              nodemodule="openalea.functional.functional",
              nodeclass="pyifelse",
              )
+
+imap_ = Fa(uid="7a0f3c5e8b1111efb5a0d4bed973e64a",
+           name="imap",
+           description=("Apply a function on an iterable, lazily: "
+                        "returns an iterator"),
+           category="Functional",
+           inputs=(dict(name='func', interface=IFunction),
+                   dict(name='seq', interface=None),),
+           outputs=(dict(name="out", interface=None),),
+           nodemodule="openalea.functional.functional",
+           nodeclass="pyimap",
+           )
+
+ifilter_ = Fa(uid="7a0f3c5f8b1111efb5a0d4bed973e64a",
+              name="ifilter",
+              description=("Return an iterator on the items of an iterable"
+                           " for which a function is true"),
+              category="Functional",
+              inputs=(dict(name='func', interface=IFunction),
+                      dict(name='seq', interface=None)),
+              outputs=(dict(name="out", interface=None),),
+              nodemodule="openalea.functional.functional",
+              nodeclass="pyifilter",
+              )
+
+ireduce_ = Fa(uid="7a0f3c608b1111efb5a0d4bed973e64a",
+              name="ireduce",
+              description=("Apply a function of two arguments cumulatively"
+                           " to the items of an iterable"),
+              category="Functional",
+              inputs=(dict(name='func', interface=IFunction),
+                      dict(name='seq', interface=None),
+                      dict(name='initial', interface=None, value=None)),
+              outputs=(dict(name="out", interface=None),),
+              nodemodule="openalea.functional.functional",
+              nodeclass="pyireduce",
+              )
+
+islice_ = Fa(uid="7a0f3c618b1111efb5a0d4bed973e64a",
+             name="islice",
+             description="Lazy slice of an iterable",
+             category="Functional",
+             inputs=(dict(name='seq', interface=None),
+                     dict(name='start', interface=IInt(min=0), value=0),
+                     dict(name='stop', interface=None, value=None),
+                     dict(name='step', interface=IInt(min=1), value=1)),
+             outputs=(dict(name="out", interface=None),),
+             nodemodule="openalea.functional.functional",
+             nodeclass="pyislice",
+             )
+
+chain_ = Fa(uid="7a0f3c628b1111efb5a0d4bed973e64a",
+            name="chain",
+            description="Lazy concatenation of two iterables",
+            category="Functional",
+            inputs=(dict(name='seq1', interface=None),
+                    dict(name='seq2', interface=None)),
+            outputs=(dict(name="out", interface=None),),
+            nodemodule="openalea.functional.functional",
+            nodeclass="pychain",
+            )
+
+batched_ = Fa(uid="7a0f3c638b1111efb5a0d4bed973e64a",
+              name="batched",
+              description="Lazy split of an iterable in lists of n items",
+              category="Functional",
+              inputs=(dict(name='seq', interface=None),
+                      dict(name='n', interface=IInt(min=1), value=1)),
+              outputs=(dict(name="out", interface=None),),
+              nodemodule="openalea.functional.functional",
+              nodeclass="pybatched",
+              )
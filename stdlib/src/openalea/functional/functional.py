@@ -17,12 +17,166 @@ __license__ =  "Cecill-C"
 __revision__ = " $Id$ "
 
 from openalea.core import Node, ITextStr, ICodeStr
-from functools import reduce
+from collections import OrderedDict
+from functools import reduce, update_wrapper
+from hashlib import sha1
+from itertools import chain, islice
 
-def pymap(func, seq):
-    """ map(func, seq) """
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _is_array(seq):
+    numpy = _numpy()
+    return numpy is not None and isinstance(seq, numpy.ndarray)
+
+
+def _vectorized(numpy, func, arr, nb_probes=8):
+    """ func(arr) if func gives the same result on an array as on each
+    of its items (e.g. lambda x: 2 * x + 1), checked on the first items.
+
+    :returns: the result or None, and the list of the results of func
+              on the first items (to be reused if it is not vectorized)
+    """
+    probe = arr[:nb_probes]
+    done = [func(x) for x in probe]
+    try:
+        expected = numpy.asarray(done)
+        res = numpy.asarray(func(probe))
+        if (res.shape != expected.shape or res.dtype != expected.dtype
+                or not numpy.array_equal(res, expected, equal_nan=True)):
+            return None, done
+        if len(arr) == len(probe):
+            return res, done
+        rest = numpy.asarray(func(arr[nb_probes:]))
+    except Exception:
+        return None, done
+    if rest.shape != (len(arr) - len(probe),) + res.shape[1:]:
+        return None, done
+    return numpy.concatenate([res, rest]), done
+
+
+def _as_array(numpy, res):
+    """ Array of a list of results, the list if they do not form one. """
+    try:
+        out = numpy.array(res)
+    except ValueError:
+        return res
+    return res if out.dtype == object else out
+
+
+def _rows(out, stop):
+    """ List of the results stored in out before stop. """
+    if out is None:
+        return []
+    # scalars as python values, as returned by func
+    return out[:stop].tolist() if out.ndim == 1 else list(out[:stop])
+
+
+def _frompyfunc_map(numpy, func, arr, chunksize):
+    """ map(func, arr) on a one dimensional array with numpy.frompyfunc,
+    by chunks to bound the memory used by intermediate objects.
+
+    func is called once per item. If it raises an exception (e.g. it
+    needs NumPy scalars), the results already computed are kept and
+    the items of arr are used from the one that failed, which is the
+    only item evaluated twice.
+
+    :returns: an array, or the list of results if they do not form
+              an array
+    """
+    # results of the current chunk
+    results = []
+
+    def call(x):
+        r = func(x)
+        results.append(r)
+        return r
+
+    ufunc = numpy.frompyfunc(call, 1, 1)
+    out = None
+    objs = None
+    for i in range(0, len(arr), chunksize):
+        del results[:]
+        try:
+            chunk_res = ufunc(arr[i:i + chunksize]).tolist()
+        except Exception:
+            done = objs if objs is not None else _rows(out, i)
+            start = i + len(results)
+            return done + results + [func(x) for x in arr[start:]]
+
+        if objs is not None:
+            objs.extend(chunk_res)
+            continue
+        try:
+            chunk = numpy.array(chunk_res)
+        except ValueError:
+            # results of different shapes
+            chunk = None
+        if (chunk is None or chunk.dtype == object or
+                (out is not None and chunk.shape[1:] != out.shape[1:])):
+            # results computed so far are kept
+            objs = _rows(out, i)
+            objs.extend(chunk_res)
+            out = None
+            continue
+        if out is None:
+            out = numpy.empty((len(arr),) + chunk.shape[1:], chunk.dtype)
+        elif chunk.dtype != out.dtype:
+            # e.g. ints then floats, or longer strings
+            out = out.astype(numpy.result_type(out, chunk))
+        out[i:i + chunksize] = chunk
+    return out if objs is None else objs
+
+
+def vmap(func, arr, chunksize=65536, vectorize=False):
+    """ map(func, arr) on a NumPy array, returning an array.
+
+    ufuncs of one argument and numpy.vectorize objects are applied on
+    the whole array in one call. Other functions are applied on chunks
+    of items with numpy.frompyfunc (one dimensional arrays, items are
+    then python scalars) or on each item along the first axis: func is
+    called once per item.
+
+    If vectorize is True, func is also applied in one call when it
+    gives the same result on an array as on each of its first items.
+
+    Results that do not form an array (e.g. items of different
+    shapes) are returned as a list.
+    """
+    numpy = _numpy()
+    if isinstance(func, numpy.ufunc) and func.nin == 1 and func.nout == 1:
+        return func(arr)
+    if isinstance(func, numpy.vectorize):
+        return func(arr)
+
+    done = []
+    if vectorize:
+        res, done = _vectorized(numpy, func, arr)
+        if res is not None:
+            return res
+
+    if not done and arr.ndim == 1 and arr.dtype != object:
+        res = _frompyfunc_map(numpy, func, arr, chunksize)
+        return _as_array(numpy, res) if isinstance(res, list) else res
+
+    return _as_array(numpy, done + [func(x) for x in arr[len(done):]])
+
+
+def pymap(func, seq, vectorize=False):
+    """ map(func, seq)
+
+    If seq is a NumPy array the map is vectorized (see vmap)
+    and the result is an array.
+    """
 
     if func is not None and seq is not None and len(seq):
+        if _is_array(seq):
+            return ( vmap(func, seq, vectorize=vectorize), )
         return ( list(map(func, seq)), )
     else:
         return ( [], )
@@ -47,6 +201,84 @@ def pyreduce(func, seq):
 
 
 
+def pyimap(func, seq):
+    """ Lazy map(func, seq)
+
+    Returns an iterator: items are evaluated one at a time, when the
+    next node consumes them, and seq can be any iterable.
+    """
+
+    if func is not None and seq is not None:
+        return ( map(func, seq), )
+    else:
+        return ( iter(()), )
+
+
+def pyifilter(func, seq):
+    """ Lazy filter(func, seq), returns an iterator. """
+
+    if func is not None and seq is not None:
+        return ( filter(func, seq), )
+    else:
+        return ( iter(()), )
+
+
+_empty = object()
+
+
+def pyireduce(func, seq, initial=None):
+    """ reduce(func, seq[, initial]) on any iterable.
+
+    Items are consumed one at a time, without building a list.
+    An empty seq gives initial, or [] if initial is None.
+    """
+
+    if func is None or seq is None:
+        return ( [], )
+
+    it = iter(seq)
+    if initial is None:
+        initial = next(it, _empty)
+        if initial is _empty:
+            return ( [], )
+    return ( reduce(func, it, initial), )
+
+
+def pyislice(seq, start=0, stop=None, step=1):
+    """ Lazy seq[start:stop:step] on any iterable (itertools.islice). """
+
+    if seq is None:
+        return ( iter(()), )
+    return ( islice(seq, start, stop, step or 1), )
+
+
+def pychain(*seqs):
+    """ Lazy concatenation of iterables (itertools.chain). """
+
+    return ( chain.from_iterable(seq for seq in seqs if seq is not None), )
+
+
+def batched(seq, n):
+    """ Iterator on lists of n consecutive items of seq.
+
+    The last list holds the remaining items.
+    """
+    it = iter(seq)
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
+
+
+def pybatched(seq, n=1):
+    """ Lazy split of an iterable in lists of n items. """
+
+    if seq is None:
+        return ( iter(()), )
+    return ( batched(seq, max(1, int(n))), )
+
+
 def pyapply(func, seq, one_argument=False):
     """ apply(func, seq)"""
 
@@ -85,6 +317,83 @@ def pyfunction(func_str):
     else:
         return None
 """
+def function_name(func_str):
+    """ Name of the function defined by a text string, '' if none. """
+    line = ''
+    for line in func_str.split('\n'):
+        if 'def ' in line:
+            break
+        if 'lambda ' in line:
+            break
+
+    if 'def' in line:
+        name = line.split('def ')[1]
+        return name.split('(')[0].strip()
+    elif 'lambda' in line:
+        return line.split('=')[0].strip()
+    return ''
+
+
+class CompiledFunction(object):
+    """ Function created from a text string.
+
+    Calls are forwarded to the function, whose signature, docstring and
+    attributes are copied (see functools.update_wrapper). Only the
+    source is pickled, the function is compiled again (once per
+    process) when unpickled, so it can be sent to the workers of the
+    multiprocessing nodes.
+    """
+
+    def __init__(self, source, name, func):
+        update_wrapper(self, func)
+        self.source = source
+        self.__name__ = name
+        self.func = func
+
+    def __call__(self, *args, **kwds):
+        return self.func(*args, **kwds)
+
+    def __reduce__(self):
+        return compiled_function, (self.source,)
+
+    def __repr__(self):
+        return '<compiled function %s>' % self.__name__
+
+
+# {sha1 of source: CompiledFunction}, most recently used last
+_compiled = OrderedDict()
+max_compiled = 128
+
+
+def compiled_function(func_str):
+    """ CompiledFunction defined by a text string, None if none.
+
+    Compiled functions are cached by a hash of the source, the
+    `max_compiled` most recently used ones are kept.
+    """
+    func_str = str(func_str)
+    key = sha1(func_str.encode('utf-8')).hexdigest()
+    try:
+        func = _compiled.pop(key)
+    except KeyError:
+        name = function_name(func_str)
+        if not name:
+            return None
+
+        # local dictionary
+        d = {}
+        exec(compile(func_str, '<pyfunction %s>' % name, 'exec'), d)
+        func = d.get(name, None)
+        if func is None:
+            return None
+        func = CompiledFunction(func_str, name, func)
+        while len(_compiled) >= max_compiled:
+            _compiled.popitem(last=False)
+
+    _compiled[key] = func
+    return func
+
+
 class pyfunction(Node):
     """
     Function method
@@ -101,35 +410,18 @@ class pyfunction(Node):
     def __call__(self, inputs):
         """ inputs is the list of input values
 
+        The function is compiled only when the code changes
+        (see compiled_function).
+
         :returns: the value
         """
         func_str = inputs[0]
         if func_str is not None:
-            # Extract the function name
-            l = func_str.split('\n')
-            line = ''
-            for line in l:
-                if 'def ' in line:
-                    break
-                if 'lambda ' in line:
-                    break
-
-            name = ''
-            if 'def' in line:
-                name = line.split('def ')[1]
-                name = name.split('(')[0].strip()
-            elif 'lambda' in line:
-                name = line.split('=')[0].strip()
-            else:
+            func = compiled_function(func_str)
+            if func is None:
                 return None
 
-            self.set_caption(name)
-
-            # local dictionary
-            d = {}
-            exec(str(func_str), d)
-
-            return (d.get(name, None), )
+            self.set_caption(func.__name__)
+            return (func, )
         else:
             return None
-
@@ -1,5 +1,6 @@
 from openalea.core import Factory as Fa
-from openalea.core import IFunction, IInt, ISequence
+from openalea.core import (IBool, IEnumStr, IFloat, IFunction, IInt,
+                           ISequence)
 
 __name__ = 'openalea.multiprocessing'
 
@@ -13,7 +14,8 @@ __authors__ = 'OpenAlea Consortium'
 __institutes__ = 'INRIA/CIRAD'
 __icon__ = ''
 
-__all__ = ['pmap_pmap', 'ppymap']
+__all__ = ['pmap_pmap', 'ppymap', 'ppyimap', 'ppyfilter', 'ppyreduce',
+           'ppymap_instrumented']
 
 pmap_pmap = Fa(uid="a08a1ef04e7611e6bff6d4bed973e64a",
                name='parallel map',
@@ -26,7 +28,18 @@ pmap_pmap = Fa(uid="a08a1ef04e7611e6bff6d4bed973e64a",
                         'desc': ''},
                        {'interface': ISequence,
                         'name': 'seq', 'value': None,
-                        'desc': ''}],
+                        'desc': ''},
+                       {'interface': IEnumStr(['default', 'thread',
+                                               'process', 'ipyparallel',
+                                               'ipyparallel cluster']),
+                        'name': 'backend', 'value': 'default',
+                        'desc': ('default reads OPENALEA_PARALLEL_BACKEND, '
+                                 'ipyparallel if not set')},
+                       {'interface': IInt(min=0, max=16777216, step=1),
+                        'name': 'N', 'value': 0,
+                        'desc': 'number of workers, 0 for all cpus'},
+                       {'interface': IBool, 'name': 'cache', 'value': False,
+                        'desc': 'store results on disk and reuse them'}],
                outputs=[
                    {'interface': None, 'name': 'result',
                     'desc': ''}],
@@ -43,8 +56,103 @@ ppymap = Fa(uid="a08a1ef14e7611e6bff6d4bed973e64a",
             inputs=({'interface': IFunction, 'name': 'func'},
                     {'interface': ISequence, 'name': 'seq'},
                     {'interface': IInt(min=1, max=16777216,
-                                       step=1), 'name': 'N'}),
+                                       step=1), 'name': 'N'},
+                    {'interface': IBool, 'name': 'shared_memory',
+                     'value': False,
+                     'desc': 'exchange NumPy arrays through shared memory'},
+                    {'interface': IBool, 'name': 'cache', 'value': False,
+                     'desc': 'store results on disk and reuse them'}),
             outputs=(dict(name="out", interface=ISequence),),
             widgetmodule=None,
             widgetclass=None,
             )
+
+ppyimap = Fa(uid="5c1e0b6e8a2e11efb5a0d4bed973e64a",
+             name='pimap',
+             description=('Apply a function on a sequence in parallel, '
+                          'lazily and by chunks'),
+             category='Functional',
+             nodemodule='openalea.multiprocessing.parallel',
+             nodeclass='pyimap',
+             inputs=({'interface': IFunction, 'name': 'func'},
+                     {'interface': ISequence, 'name': 'seq'},
+                     {'interface': IInt(min=0, max=16777216,
+                                        step=1), 'name': 'N', 'value': 0},
+                     {'interface': IInt(min=0, max=16777216, step=1),
+                      'name': 'chunksize', 'value': 0,
+                      'desc': '0 to tune it automatically'},
+                     {'interface': IBool, 'name': 'ordered',
+                      'value': True}),
+             outputs=(dict(name="out", interface=None,
+                           desc='iterator on results'),),
+             widgetmodule=None,
+             widgetclass=None,
+             )
+
+ppyfilter = Fa(uid="0d5c6a1e8a3f11efb5a0d4bed973e64a",
+               name='pfilter',
+               description=('Apply a predicate on a sequence in parallel '
+                            'and return only true values'),
+               category='Functional',
+               nodemodule='openalea.multiprocessing.parallel',
+               nodeclass='ppyfilter',
+               inputs=({'interface': IFunction, 'name': 'func'},
+                       {'interface': ISequence, 'name': 'seq'},
+                       {'interface': IInt(min=0, max=16777216,
+                                          step=1), 'name': 'N', 'value': 0},
+                       {'interface': IInt(min=0, max=16777216, step=1),
+                        'name': 'chunksize', 'value': 0,
+                        'desc': '0 for 4 chunks per worker'}),
+               outputs=(dict(name="out", interface=ISequence),),
+               widgetmodule=None,
+               widgetclass=None,
+               )
+
+ppyreduce = Fa(uid="0d5c6a1f8a3f11efb5a0d4bed973e64a",
+               name='preduce',
+               description=('Reduce a sequence in parallel with an '
+                            'associative function of two arguments'),
+               category='Functional',
+               nodemodule='openalea.multiprocessing.parallel',
+               nodeclass='ppyreduce',
+               inputs=({'interface': IFunction, 'name': 'func'},
+                       {'interface': ISequence, 'name': 'seq'},
+                       {'interface': IInt(min=0, max=16777216,
+                                          step=1), 'name': 'N', 'value': 0},
+                       {'interface': None, 'name': 'initial', 'value': None,
+                        'desc': 'optional first value'}),
+               outputs=(dict(name="out", interface=None),),
+               widgetmodule=None,
+               widgetclass=None,
+               )
+
+ppymap_instrumented = Fa(uid="4f1d0c2e8a4011efb5a0d4bed973e64a",
+                         name='pmap instrumented',
+                         description=('Apply a function on a sequence in '
+                                      'parallel, item by item, with error '
+                                      'capture, retries and timings'),
+                         category='Functional',
+                         nodemodule='openalea.multiprocessing.parallel',
+                         nodeclass='pymap_instrumented',
+                         inputs=({'interface': IFunction, 'name': 'func'},
+                                 {'interface': ISequence, 'name': 'seq'},
+                                 {'interface': IInt(min=0, max=16777216,
+                                                    step=1),
+                                  'name': 'N', 'value': 0},
+                                 {'interface': IEnumStr(['raise', 'return']),
+                                  'name': 'errors', 'value': 'raise',
+                                  'desc': ('raise with the index of the item '
+                                           'or return ItemError objects')},
+                                 {'interface': IInt(min=0, max=100, step=1),
+                                  'name': 'retries', 'value': 0},
+                                 {'interface': IFloat(min=0.),
+                                  'name': 'timeout', 'value': 0.,
+                                  'desc': 'seconds per item, 0 for no limit'},
+                                 {'interface': IFunction, 'name': 'progress',
+                                  'value': None,
+                                  'desc': 'called with (nb_done, total)'}),
+                         outputs=(dict(name="out", interface=ISequence),
+                                  dict(name="timings", interface=ISequence)),
+                         widgetmodule=None,
+                         widgetclass=None,
+                         )
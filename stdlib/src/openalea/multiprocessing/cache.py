@@ -0,0 +1,264 @@
+# -*- python -*-
+#
+#       OpenAlea.StdLib
+#
+#       Copyright 2006-2023 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+""" On-disk cache of results for the map nodes.
+
+Each result of func(item) is stored in a file named after a hash of
+the pickled function and of the pickled item, so re-evaluating a
+dataflow only dispatches the items whose result is not known yet.
+The total size of the cache directory is bounded: least recently
+used results are removed first.
+
+The directory is read from the OPENALEA_CACHE_DIR environment
+variable, ~/.cache/openalea/map by default.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import hashlib
+import marshal
+import os
+import tempfile
+import types
+from threading import Lock
+
+try:
+    import dill as pickle
+except ImportError:
+    import pickle
+
+CACHE_DIR_VARIABLE = 'OPENALEA_CACHE_DIR'
+DEFAULT_MAX_SIZE = 1 << 30
+
+
+def default_directory():
+    """ Cache directory named by the OPENALEA_CACHE_DIR variable. """
+    directory = os.environ.get(CACHE_DIR_VARIABLE)
+    if directory:
+        return directory
+    return os.path.join(os.path.expanduser('~'), '.cache', 'openalea', 'map')
+
+
+def _global_names(code):
+    """ Names of globals possibly used by code and its nested functions. """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def _update_value(h, value, seen):
+    if isinstance(value, types.ModuleType):
+        h.update(value.__name__.encode())
+    elif isinstance(value, types.FunctionType):
+        _update_function(h, value, seen)
+    else:
+        try:
+            h.update(pickle.dumps(value, protocol=4))
+        except Exception:
+            h.update(repr(value).encode())
+
+
+def _update_function(h, func, seen):
+    """ Hash the code of func and the values it uses. """
+    if id(func) in seen:
+        return
+    seen.add(id(func))
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return
+    try:
+        h.update(marshal.dumps(code))
+    except ValueError:
+        pass
+    for value in (getattr(func, '__defaults__', None),
+                  getattr(func, '__kwdefaults__', None)):
+        _update_value(h, value, seen)
+    for cell in getattr(func, '__closure__', None) or ():
+        try:
+            _update_value(h, cell.cell_contents, seen)
+        except ValueError:
+            # empty cell
+            pass
+    glob = getattr(func, '__globals__', {})
+    for name in sorted(_global_names(code)):
+        if name in glob:
+            h.update(name.encode())
+            _update_value(h, glob[name], seen)
+
+
+def function_hash(func):
+    """ Hash of a function, changing when its code changes.
+
+    Functions pickled by reference (module functions without dill)
+    are also identified by their bytecode and constants, default
+    arguments, closure cells and the values of the globals they
+    refer to (functions among them are hashed the same way, modules
+    by name only).
+    """
+    h = hashlib.sha256(pickle.dumps(func))
+    _update_function(h, func, set())
+    return h.digest()
+
+
+class ResultCache(object):
+    """ Results stored in a directory, evicted by size in LRU order.
+
+    Hits refresh the modification time of their file, which is
+    used as the last access time by the eviction.
+    """
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param directory: cache directory (see default_directory)
+        :param max_size: maximum total size of stored results in bytes
+        """
+        self.directory = directory or default_directory()
+        self.max_size = max_size
+        self._size = None
+        self._lock = Lock()
+
+    def key(self, func_hash, item):
+        """ Key of the result of func(item). """
+        h = hashlib.sha256(func_hash)
+        h.update(pickle.dumps(item, protocol=4))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pkl')
+
+    def get(self, key):
+        """ Return (True, result) for a hit, (False, None) otherwise. """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                res = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True, res
+
+    def set(self, key, res):
+        """ Store a result. Unpicklable results are not stored. """
+        try:
+            data = pickle.dumps(res, protocol=4)
+        except Exception:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+
+    def _files(self):
+        """ List of (mtime, size, path) of stored results. """
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.pkl'):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def size(self):
+        """ Total size of stored results in bytes. """
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            return self._size
+
+    def evict(self):
+        """ Remove least recently used results above max_size. """
+        if self.size() <= self.max_size:
+            return
+        with self._lock:
+            files = sorted(self._files())
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._size = total
+
+    def clear(self):
+        """ Remove all stored results. """
+        with self._lock:
+            for _, _, path in self._files():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+    def map(self, mapper, func, seq):
+        """ map(func, seq) computing only the missing results.
+
+        :param mapper: function (func, items) -> list of results,
+                       called once with the items not in the cache
+        :returns: the list of results in the order of seq
+        """
+        func_hash = function_hash(func)
+        keys = [self.key(func_hash, item) for item in seq]
+
+        res = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            found, value = self.get(key)
+            if found:
+                res[i] = value
+            else:
+                missing.append(i)
+
+        if missing:
+            computed = mapper(func, [seq[i] for i in missing])
+            for i, value in zip(missing, computed):
+                res[i] = value
+                self.set(keys[i], value)
+            self.evict()
+
+        return res
+
+
+_caches = {}
+_caches_lock = Lock()
+
+
+def get_cache(directory=None):
+    """ Return the shared cache of a directory (see default_directory). """
+    directory = directory or default_directory()
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = ResultCache(directory)
+            _caches[directory] = cache
+    return cache
@@ -0,0 +1,195 @@
+# -*- python -*-
+#
+#       OpenAlea.StdLib
+#
+#       Copyright 2006-2023 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+""" Executors used by the parallel map nodes.
+
+An executor evaluates map(func, seq) with a given backend:
+
+ - 'thread': a pool of threads of the current process
+ - 'process': the shared pool of worker processes (see pool)
+ - 'ipyparallel': the engines of a running ipyparallel cluster
+ - 'ipyparallel cluster': a local ipyparallel cluster started
+   on first use
+
+Executors are cached, so clients, clusters and pools are created once
+per process and reused by every node evaluation. The backend used by
+default is read from the OPENALEA_PARALLEL_BACKEND environment variable,
+so that the same dataflow runs on a laptop or on a cluster.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import atexit
+import os
+from abc import ABC, abstractmethod
+from threading import Lock
+
+from .pool import get_pool, pool_map, pool_size
+
+DEFAULT_BACKEND_VARIABLE = 'OPENALEA_PARALLEL_BACKEND'
+
+
+class Executor(ABC):
+    """ Evaluate map(func, seq) somewhere. """
+
+    @abstractmethod
+    def map(self, func, seq):
+        """ Return the list of func(x) for x in seq, in order. """
+
+    def shutdown(self):
+        """ Free the resources of the executor. """
+        pass
+
+
+class ThreadExecutor(Executor):
+    """ Threads of the current process, for functions releasing the GIL
+    or waiting on I/O. """
+
+    def __init__(self, N=None):
+        from concurrent.futures import ThreadPoolExecutor
+        self._pool = ThreadPoolExecutor(pool_size(N))
+
+    def map(self, func, seq):
+        return list(self._pool.map(func, seq))
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+class ProcessExecutor(Executor):
+    """ The shared pool of N worker processes. """
+
+    def __init__(self, N=None):
+        self._N = N
+
+    def map(self, func, seq):
+        seq = list(seq)
+        return pool_map(get_pool(self._N, [func] + seq[:1]), func, seq)
+
+
+class IPyParallelExecutor(Executor):
+    """ Engines of an already running ipyparallel cluster.
+
+    The client is connected on first use and kept.
+    Arguments are those of ipyparallel.Client (e.g. profile,
+    url_file, cluster_id).
+    """
+
+    def __init__(self, **kwds):
+        self._kwds = kwds
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            from ipyparallel import Client
+            self._client = Client(**self._kwds)
+        return self._client
+
+    def map(self, func, seq):
+        return self.client()[:].map_sync(func, seq)
+
+    def shutdown(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class IPyParallelClusterExecutor(IPyParallelExecutor):
+    """ A local ipyparallel cluster of N engines, started on first use
+    and stopped at exit. """
+
+    def __init__(self, N=None):
+        IPyParallelExecutor.__init__(self)
+        self._n = pool_size(N)
+        self._cluster = None
+
+    def client(self):
+        if self._client is None:
+            import ipyparallel as ipp
+            self._cluster = ipp.Cluster(n=self._n)
+            self._cluster.start_cluster_sync()
+            self._client = self._cluster.connect_client_sync()
+            self._client.wait_for_engines(self._n)
+        return self._client
+
+    def shutdown(self):
+        IPyParallelExecutor.shutdown(self)
+        if self._cluster is not None:
+            self._cluster.stop_cluster_sync()
+            self._cluster = None
+
+
+backends = {'thread': ThreadExecutor,
+            'process': ProcessExecutor,
+            'ipyparallel': IPyParallelExecutor,
+            'ipyparallel cluster': IPyParallelClusterExecutor,
+            }
+
+_executors = {}
+_lock = Lock()
+
+
+def default_backend(default='process'):
+    """ Backend named by the OPENALEA_PARALLEL_BACKEND variable. """
+    return os.environ.get(DEFAULT_BACKEND_VARIABLE, default)
+
+
+def get_executor(backend=None, **kwds):
+    """ Return the cached executor for a backend and its arguments.
+
+    :param backend: one of `backends`, None or 'default' for
+                    default_backend()
+    :param kwds: arguments of the executor (N for thread, process and
+                 ipyparallel cluster, Client arguments for ipyparallel)
+    """
+    if backend is None or backend == 'default':
+        backend = default_backend()
+    if backend not in backends:
+        raise ValueError('unknown parallel backend: %s' % backend)
+
+    key = (backend, tuple(sorted(kwds.items())))
+    with _lock:
+        executor = _executors.get(key)
+        if executor is None:
+            executor = backends[backend](**kwds)
+            _executors[key] = executor
+    return executor
+
+
+def select_executor(backend='default', N=0, default='process'):
+    """ Executor of a node with backend and N inputs.
+
+    :param backend: one of `backends`, None or 'default' for the
+                    backend named by OPENALEA_PARALLEL_BACKEND
+    :param N: number of workers of the thread, process and
+              ipyparallel cluster backends (all cpus if N < 1)
+    :param default: backend used if the variable is not set
+    """
+    if backend is None or backend == 'default':
+        backend = default_backend(default)
+    if backend in ('thread', 'process', 'ipyparallel cluster'):
+        return get_executor(backend, N=N)
+    return get_executor(backend)
+
+
+def shutdown_executors():
+    """ Shut down all cached executors. """
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown()
+
+
+atexit.register(shutdown_executors)
@@ -18,34 +18,431 @@ __revision__ = " $Id$ "
 
 from openalea.core import Node, ITextStr
 
-from multiprocessing import Pool, cpu_count
 from functools import reduce
 try:
     import dill as pickle
 except ImportError:
     import pickle
 
-def pymap(func, seq, N):
-    """ map(func, seq) """
+from collections import deque
+from itertools import islice
+from queue import Empty, Queue
+from time import monotonic, perf_counter
+from traceback import format_exc
+
+from .pool import (BrokenPoolError, check_workers, get_pool, pool_map,
+                   pool_size, pool_starmap, wait, workers)
+
+def _is_array(seq):
+    try:
+        import numpy
+    except ImportError:
+        return False
+    return isinstance(seq, numpy.ndarray)
+
+
+def pymap(func, seq, N, shared_memory=False, cache=False):
+    """ map(func, seq) 
+    
+    Evaluated by the shared pool of N workers (all cpus if N < 1),
+    which is kept alive between evaluations.
+
+    If shared_memory is True and seq is a NumPy array, items and
+    results are exchanged through shared memory instead of being
+    pickled (see sharedarray.shared_map). The result is then an
+    array when func returns arrays of a fixed shape.
+
+    If cache is True, results are stored on disk and only the items
+    whose result is not in the cache are sent to the pool
+    (see cache.ResultCache).
+    """
     
     # try to pickle the function
     pickle.dumps(func)
-    if N <1:
-        N = cpu_count()
 
-    p = Pool(N)
     res = []
-    if func and seq:
-        try:
-            res = p.map(func, seq)
-        except Exception as e:
-            pool.terminate()
-            pool.join()
-            raise e
+    if not func or seq is None:
+        return res,
+    if _is_array(seq):
+        if len(seq) == 0:
+            return res,
+    elif not seq:
+        return res,
+
+    shared = shared_memory and _is_array(seq)
+    if shared:
+        from .sharedarray import shared_map
+
+        def mapper(f, items):
+            import numpy
+            return list(shared_map(f, numpy.asarray(items), N))
+    else:
+        def mapper(f, items):
+            return pool_map(get_pool(N, [f] + _sample(items)), f, items)
+
+    if cache:
+        from .cache import get_cache
+        if not _is_array(seq):
+            # the cache indexes items, seq can be an iterator
+            seq = list(seq)
+        res = get_cache().map(mapper, func, seq)
+        if shared:
+            res = _stack(res)
+    elif shared:
+        res = shared_map(func, seq, N)
+    else:
+        res = mapper(func, seq)
 
     return res, 
 
 
+def _sample(seq):
+    """ First item of seq in a list, empty if seq is not a sequence. """
+    try:
+        return list(seq[:1])
+    except (TypeError, KeyError):
+        return []
+
+
+def _stack(res):
+    """ Array of results if they are arrays of the same shape. """
+    import numpy
+    if (res and all(isinstance(r, numpy.ndarray) for r in res)
+            and len(set((r.shape, r.dtype) for r in res)) == 1):
+        return numpy.stack(res)
+    return res
+
+
+def _map_chunk(func, chunk):
+    """ Evaluate func on a chunk of items in a worker.
+
+    :returns: the list of results and the time spent
+    """
+    t = perf_counter()
+    res = [func(x) for x in chunk]
+    return res, perf_counter() - t
+
+
+class ChunkSize(object):
+    """ Size of the chunks sent to workers.
+
+    If no size is given, it is tuned so that a chunk takes about
+    `target` seconds to evaluate, starting with small chunks.
+    It is bounded by `maximum` to bound memory and, for sized
+    inputs, by the size needed to give 4 chunks to each worker.
+    """
+
+    def __init__(self, seq, N, chunksize=0, target=0.05, maximum=10000):
+        self.fixed = chunksize is not None and chunksize > 0
+        self.size = int(chunksize) if self.fixed else 16
+        self.target = target
+        self.maximum = maximum
+        try:
+            self.maximum = max(1, min(maximum, -(-len(seq) // (4 * N))))
+        except TypeError:
+            pass
+        if not self.fixed:
+            self.size = min(self.size, self.maximum)
+
+    def update(self, nb_items, elapsed):
+        """ Tune the size from the time spent on the last chunk. """
+        if self.fixed or nb_items == 0:
+            return
+        if elapsed <= 0:
+            size = self.size * 2
+        else:
+            size = int(nb_items * self.target / elapsed)
+        # change slowly to avoid oscillations
+        size = max(self.size // 2, min(size, self.size * 2))
+        self.size = max(1, min(size, self.maximum))
+
+
+def _chunks(seq, chunksize):
+    it = iter(seq)
+    while True:
+        chunk = list(islice(it, chunksize.size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def imap_chunks(func, seq, N=None, chunksize=0, ordered=True, prefetch=2):
+    """ Lazy parallel map(func, seq) on the shared pool.
+
+    Items are read from seq by chunks and at most `prefetch`
+    chunks per worker are in flight at any time, so memory stays
+    bounded whatever the length of seq (which can be a generator).
+
+    :param func: picklable function of one argument
+    :param seq: any iterable
+    :param N: number of workers (all cpus if N < 1)
+    :param chunksize: number of items sent to a worker at once,
+                      0 to tune it automatically
+    :param ordered: if False, results are yielded as soon as
+                    they are available instead of in input order
+    :param prefetch: number of chunks in flight per worker
+    :returns: an iterator on results
+    """
+    pool = get_pool(N, (func,))
+    processes = workers(pool)
+    max_pending = max(1, prefetch * pool_size(N))
+    chunksize = ChunkSize(seq, pool_size(N), chunksize)
+
+    if ordered:
+        pending = deque()
+        for chunk in _chunks(seq, chunksize):
+            pending.append((len(chunk),
+                            pool.apply_async(_map_chunk, (func, chunk))))
+            if len(pending) >= max_pending:
+                nb, async_res = pending.popleft()
+                res, elapsed = wait(pool, async_res, processes)
+                chunksize.update(nb, elapsed)
+                yield from res
+        while pending:
+            nb, async_res = pending.popleft()
+            yield from wait(pool, async_res, processes)[0]
+    else:
+        done = Queue()
+        nb_pending = 0
+
+        def wait_one():
+            while True:
+                try:
+                    ok, value = done.get(timeout=0.1)
+                    break
+                except Empty:
+                    check_workers(pool, processes)
+            if not ok:
+                raise value
+            return value
+
+        def on_error(e):
+            done.put((False, e))
+
+        for chunk in _chunks(seq, chunksize):
+            def on_result(r, nb=len(chunk)):
+                done.put((True, (nb, r)))
+
+            pool.apply_async(_map_chunk, (func, chunk),
+                             callback=on_result, error_callback=on_error)
+            nb_pending += 1
+            if nb_pending >= max_pending:
+                nb, (res, elapsed) = wait_one()
+                nb_pending -= 1
+                chunksize.update(nb, elapsed)
+                yield from res
+        while nb_pending:
+            nb, (res, elapsed) = wait_one()
+            nb_pending -= 1
+            yield from res
+
+
+def pyimap(func, seq, N, chunksize=0, ordered=True):
+    """ Lazy map(func, seq) evaluated by the shared pool of N workers.
+
+    Returns an iterator that downstream nodes consume incrementally
+    (see imap_chunks).
+    """
+    # try to pickle the function
+    pickle.dumps(func)
+
+    if func and seq is not None:
+        return imap_chunks(func, seq, N, chunksize, ordered),
+    else:
+        return iter(()),
+
+
+class ItemError(object):
+    """ Failure of func on one item of a map.
+
+    Exceptions are described by strings, as they are not always
+    picklable. Returned in place of the result when errors are kept.
+    """
+
+    def __init__(self, index, item, type, message, traceback='',
+                 attempts=1):
+        self.index = index
+        self.item = item
+        self.type = type
+        self.message = message
+        self.traceback = traceback
+        self.attempts = attempts
+
+    def __repr__(self):
+        return 'ItemError(%d, %s: %s)' % (self.index, self.type,
+                                          self.message)
+
+
+class MapError(Exception):
+    """ Raised when func failed on an item of a map. """
+
+    def __init__(self, error):
+        Exception.__init__(self, 'item %d (%r) failed after %d attempt(s): '
+                           '%s: %s\n%s' % (error.index, error.item,
+                                           error.attempts, error.type,
+                                           error.message, error.traceback))
+        self.error = error
+        self.index = error.index
+
+
+def _timed_call(func, item):
+    """ Evaluate func(item) in a worker.
+
+    :returns: (ok, result or (type, message, traceback), time spent)
+    """
+    t = perf_counter()
+    try:
+        res = func(item)
+    except Exception as e:
+        return False, (type(e).__name__, str(e), format_exc()), \
+            perf_counter() - t
+    return True, res, perf_counter() - t
+
+
+def imap_instrumented(func, seq, N=None, retries=0, timeout=None):
+    """ Parallel map(func, seq) yielding results as they are available.
+
+    Each item is a separate task of the shared pool. An item whose
+    evaluation raised an exception, that did not finish within
+    `timeout` seconds, or whose worker crashed, is submitted again
+    at most `retries` times. When a worker crashes, the pool is
+    replaced and every item it was evaluating counts as a failed
+    attempt.
+
+    :param func: picklable function of one argument
+    :param seq: sequence of items
+    :param N: number of workers (all cpus if N < 1)
+    :param retries: number of new attempts for a failing item
+    :param timeout: time allowed for an item in seconds, None to wait
+                    forever
+    :returns: an iterator on (index, result, time spent), result is an
+              ItemError if all attempts failed
+    """
+    items = list(seq)
+    pool = get_pool(N, [func] + items[:1])
+    processes = workers(pool)
+    # one item per worker in flight, so that the time allowed
+    # is not spent waiting in the queue of the pool
+    max_pending = pool_size(N)
+    todo = deque(range(len(items)))
+    done = Queue()
+    # index: (attempt, deadline)
+    pending = {}
+
+    def submit(i, attempt):
+        def on_result(r):
+            done.put((i, attempt, r))
+
+        def on_error(e):
+            done.put((i, attempt, (False, (type(e).__name__, str(e), ''),
+                                   0.)))
+
+        deadline = None if timeout is None else monotonic() + timeout
+        pending[i] = (attempt, deadline)
+        pool.apply_async(_timed_call, (func, items[i]),
+                         callback=on_result, error_callback=on_error)
+
+    def failed(i, attempt, error):
+        if attempt < retries:
+            submit(i, attempt + 1)
+            return None
+        del pending[i]
+        return ItemError(i, items[i], *error, attempts=attempt + 1)
+
+    while todo or pending:
+        while todo and len(pending) < max_pending:
+            submit(todo.popleft(), 0)
+
+        try:
+            i, attempt, (ok, res, elapsed) = done.get(
+                timeout=0.1 if timeout is None else min(timeout, 1.))
+        except Empty:
+            try:
+                check_workers(pool, processes)
+            except BrokenPoolError:
+                # tasks of the broken pool are lost
+                pool = get_pool(N, [func] + items[:1])
+                processes = workers(pool)
+                for i, (attempt, _) in list(pending.items()):
+                    error = failed(i, attempt,
+                                   ('BrokenPoolError',
+                                    'a worker of the pool died', ''))
+                    if error is not None:
+                        yield i, error, 0.
+                continue
+            if timeout is None:
+                continue
+            now = monotonic()
+            late = [(i, attempt) for i, (attempt, deadline)
+                    in pending.items() if deadline < now]
+            for i, attempt in late:
+                error = failed(i, attempt,
+                               ('TimeoutError',
+                                'no result after %g s' % timeout, ''))
+                if error is not None:
+                    yield i, error, timeout
+            continue
+
+        if pending.get(i, (None,))[0] != attempt:
+            # result of an attempt already given up
+            continue
+        if ok:
+            del pending[i]
+            yield i, res, elapsed
+        else:
+            error = failed(i, attempt, res)
+            if error is not None:
+                yield i, error, elapsed
+
+
+def instrumented_map(func, seq, N=None, errors='raise', retries=0,
+                     timeout=None, progress=None):
+    """ Parallel map(func, seq) with error capture, retries and timings.
+
+    :param errors: 'raise' to raise a MapError for the first item that
+                   failed, 'return' to put an ItemError in its place
+    :param retries, timeout: see imap_instrumented
+    :param progress: if not None, function called with (nb_done, total)
+                     each time an item is finished
+    :returns: the list of results and the list of time spent on each
+              item, in the order of seq
+    """
+    if errors not in ('raise', 'return'):
+        raise ValueError('errors must be raise or return: %s' % errors)
+
+    items = list(seq)
+    res = [None] * len(items)
+    timings = [0.] * len(items)
+    it = imap_instrumented(func, items, N, retries, timeout)
+    for nb, (i, r, elapsed) in enumerate(it, 1):
+        if errors == 'raise' and isinstance(r, ItemError):
+            it.close()
+            raise MapError(r)
+        res[i] = r
+        timings[i] = elapsed
+        if progress is not None:
+            progress(nb, len(items))
+    return res, timings
+
+
+def pymap_instrumented(func, seq, N, errors='raise', retries=0, timeout=0.,
+                       progress=None):
+    """ map(func, seq) evaluated by the shared pool of N workers,
+    item by item, with error capture and retries (see instrumented_map).
+
+    :param timeout: time allowed for an item in seconds, 0 for no limit
+    :returns: the results and the time spent on each item
+    """
+    # try to pickle the function
+    pickle.dumps(func)
+
+    if not (func and seq is not None):
+        return [], []
+    return instrumented_map(func, seq, N, errors, retries,
+                            timeout if timeout and timeout > 0 else None,
+                            progress)
+
+
 def pyfilter(func, seq):
     """ filter(func, seq) """
     
@@ -65,6 +462,74 @@ def pyreduce(func, seq):
 
 
 
+def _filter_mask(func, chunk):
+    """ Evaluate a predicate on a chunk of items in a worker. """
+    return [bool(func(x)) for x in chunk]
+
+
+def _reduce_chunk(func, chunk):
+    """ Reduce a chunk of items in a worker. """
+    return reduce(func, chunk)
+
+
+def _split(seq, size):
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+
+def ppyfilter(func, seq, N, chunksize=0):
+    """ filter(func, seq) evaluated by the shared pool of N workers.
+
+    The predicate is evaluated on chunks of items in the workers,
+    only booleans are sent back and the order of items is preserved.
+
+    :param chunksize: number of items per chunk, 0 to give
+                      about 4 chunks to each worker
+    """
+    # try to pickle the function
+    pickle.dumps(func)
+
+    if not (func and seq):
+        return ( [], )
+
+    seq = list(seq)
+    if chunksize < 1:
+        chunksize = max(1, -(-len(seq) // (4 * pool_size(N))))
+
+    masks = pool_starmap(get_pool(N, [func] + seq[:1]), _filter_mask,
+                         [(func, chunk) for chunk in _split(seq, chunksize)])
+    keep = (ok for mask in masks for ok in mask)
+    return ( [x for x, ok in zip(seq, keep) if ok], )
+
+
+def ppyreduce(func, seq, N, initial=None):
+    """ reduce(func, seq[, initial]) evaluated by the shared pool of N workers.
+
+    Tree reduction: chunks of items are reduced in parallel, then
+    chunks of partial results, until few enough of them remain to
+    be reduced locally. func must be associative, the order of
+    items is preserved so it does not need to be commutative.
+
+    :param initial: if not None, value placed before the items
+    """
+    # try to pickle the function
+    pickle.dumps(func)
+
+    if not (func and seq):
+        return ( [] if initial is None else initial, )
+
+    items = list(seq)
+    n = pool_size(N)
+    pool = get_pool(N, [func] + items[:1])
+    while len(items) > 2 * n:
+        size = max(2, -(-len(items) // (4 * n)))
+        items = pool_starmap(pool, _reduce_chunk,
+                             [(func, chunk) for chunk in _split(items, size)])
+
+    if initial is not None:
+        items.insert(0, initial)
+    return ( reduce(func, items), )
+
+
 def pyapply(func, seq):
     """ apply(func, seq)"""
 
@@ -122,31 +587,12 @@ class pyfunction(Node):
         """
         func_str = inputs[0]
         if func_str:
-            # Extract the function name
-            l = func_str.split('\n')
-            line = ''
-            for line in l:
-                if 'def ' in line:
-                    break
-                if 'lambda ' in line:
-                    break
-
-            name = ''
-            if 'def' in line:
-                name = line.split('def ')[1]
-                name = name.split('(')[0].strip()
-            elif 'lambda' in line:
-                name = line.split('=')[0].strip()
-            else:
+            from openalea.functional.functional import compiled_function
+            func = compiled_function(func_str)
+            if func is None:
                 return None
 
-            self.set_caption(name)
-
-            # local dictionary
-            d = {}
-            exec(str(func_str), d)
-            
-            return (d.get(name, None), )
+            self.set_caption(func.__name__)
+            return (func, )
         else:
             return None
-
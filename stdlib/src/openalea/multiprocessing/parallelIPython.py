@@ -18,17 +18,21 @@ __revision__ = " $Id: parallel.py 2245 2010-02-08 17:11:34Z cokelaer $ "
 
 from openalea.core import Node, ITextStr
 
-import ipyparallel as ipp
+from .executor import select_executor
 
-def pmap(func, seq):
-    """ map(func, seq) """
+def pmap(func, seq, backend='default', N=4):
+    """ map(func, seq) 
+    
+    Evaluated by a parallel backend (see executor.select_executor).
+    With 'default', the backend is read from the
+    OPENALEA_PARALLEL_BACKEND environment variable and falls back
+    on a local cluster of N ipyparallel engines, started on the first
+    call and reused by the following ones.
+    """
     
     if func and seq:
-        cluster = ipp.Cluster(n=4)
-        cluster.start_cluster_sync()
-        rc = cluster.connect_client_sync()
-        dview = rc[:]
-        return ( dview.map_sync(func, seq), )
+        executor = select_executor(backend, N, default='ipyparallel cluster')
+        return ( executor.map(func, seq), )
     else:
         return ( [], )
 
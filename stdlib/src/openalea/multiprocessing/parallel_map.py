@@ -1,16 +1,30 @@
 from types import FunctionType
 
-def parallel_map(function, seq):
+from .executor import select_executor
+
+def parallel_map(function, seq, backend='default', N=0, cache=False):
     '''    
-    '''
-    from ipyparallel import Client
-    rc = Client() # remote client
+    map(function, seq) evaluated by a parallel backend (see executor):
+    'thread', 'process', 'ipyparallel' (a running cluster) or
+    'ipyparallel cluster' (a local cluster started once).
 
-    dview = rc[:]
-    #lview.block = True
+    With 'default', the backend is read from the
+    OPENALEA_PARALLEL_BACKEND environment variable and
+    falls back on 'ipyparallel'.
+
+    If cache is True, results are stored on disk and only the
+    items whose result is not in the cache are evaluated
+    (see cache.ResultCache).
+    '''
+    executor = select_executor(backend, N, default='ipyparallel')
 
     if function and seq:
-        return ( dview.map_sync(function, seq), )
+        if cache:
+            from .cache import get_cache
+            res = get_cache().map(lambda f, items: executor.map(f, items),
+                                  function, list(seq))
+            return ( res, )
+        return ( executor.map(function, seq), )
     else:
         return ( [], )
 
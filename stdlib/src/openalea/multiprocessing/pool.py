@@ -0,0 +1,224 @@
+# -*- python -*-
+#
+#       OpenAlea.StdLib
+#
+#       Copyright 2006-2023 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+""" Process-wide pools of workers shared by the parallel nodes.
+
+Pools are created on first use, kept alive between node evaluations
+and shut down when the interpreter exits.
+
+Workers are forked when a pool is created: functions and classes
+defined later in `__main__` (e.g. in an interactive session) do not
+exist in them. get_pool is given the objects sent to workers and
+creates a new pool when they refer to such definitions.
+
+A worker dying while it runs a task (e.g. when it can not unpickle it)
+is replaced by the pool but its task is lost. Results are waited with
+wait (or pool_map, pool_starmap, pool_apply), which raise
+BrokenPoolError instead of blocking forever; the broken pool is
+discarded and the next call to get_pool creates a new one.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+import atexit
+import os
+import sys
+from multiprocessing import Pool, TimeoutError, cpu_count
+from threading import Lock
+
+_pools = {}
+# {N: content of __main__ when the pool was created}
+_main_snapshots = {}
+_lock = Lock()
+
+
+class BrokenPoolError(RuntimeError):
+    """ A worker of a pool died, its tasks will never complete. """
+    pass
+
+
+def pool_size(N=None):
+    """ Number of workers used for N (all cpus if N is None or < 1). """
+    if N is None or N < 1:
+        return cpu_count()
+    return int(N)
+
+
+def _main_names(obj):
+    """ Names of the __main__ globals pickled by reference with obj. """
+    names = []
+    for o in (obj, type(obj)):
+        if getattr(o, '__module__', None) != '__main__':
+            continue
+        qualname = getattr(o, '__qualname__', '')
+        if qualname and '<locals>' not in qualname:
+            names.append(qualname.split('.')[0])
+    return names
+
+
+def _main_changed(snapshot, objects):
+    """ True if objects refer to __main__ globals created or redefined
+    since the snapshot. """
+    main = sys.modules.get('__main__')
+    for obj in objects:
+        for name in _main_names(obj):
+            if snapshot.get(name) is not getattr(main, name, None):
+                return True
+    return False
+
+
+def _snapshot_main():
+    main = sys.modules.get('__main__')
+    return dict(vars(main)) if main is not None else {}
+
+
+def get_pool(N=None, objects=()):
+    """ Return the shared pool of N workers.
+
+    The pool is created the first time a given size is requested and
+    reused by the following calls.
+
+    :param objects: objects that will be sent to the workers (function,
+                    sample item...). If one of them is defined in
+                    __main__ after the workers were forked, they could
+                    not unpickle it: the pool is replaced by a new one.
+    """
+    N = pool_size(N)
+    old = None
+    with _lock:
+        pool = _pools.get(N)
+        if pool is not None and objects and \
+                _main_changed(_main_snapshots[N], objects):
+            old = pool
+            pool = None
+        if pool is None:
+            if os.name == 'posix':
+                # workers must share the tracker of shared memory
+                # blocks of this process (see sharedarray)
+                from multiprocessing import resource_tracker
+                resource_tracker.ensure_running()
+            _main_snapshots[N] = _snapshot_main()
+            pool = Pool(N)
+            _pools[N] = pool
+
+    if old is not None:
+        old.close()
+    return pool
+
+
+def close_pool(N=None):
+    """ Stop the shared pool of N workers, or all pools if N is None.
+
+    Running tasks are interrupted. A new pool is created
+    by the next call to get_pool.
+    """
+    with _lock:
+        if N is None:
+            pools = list(_pools.values())
+            _pools.clear()
+            _main_snapshots.clear()
+        else:
+            pool = _pools.pop(pool_size(N), None)
+            _main_snapshots.pop(pool_size(N), None)
+            pools = [] if pool is None else [pool]
+
+    for pool in pools:
+        pool.terminate()
+        pool.join()
+
+
+def discard_pool(pool):
+    """ Stop a pool, and no longer return it from get_pool. """
+    with _lock:
+        for size, p in list(_pools.items()):
+            if p is pool:
+                del _pools[size]
+                del _main_snapshots[size]
+    pool.terminate()
+
+
+def workers(pool):
+    """ Worker processes of a pool, to be given to wait. """
+    return list(pool._pool)
+
+
+def check_workers(pool, processes):
+    """ Raise BrokenPoolError (and discard the pool) if one of the
+    processes died or was replaced. """
+    current = pool._pool
+    if current != processes or any(p.exitcode is not None for p in current):
+        discard_pool(pool)
+        raise BrokenPoolError('a worker of the pool died, '
+                              'its tasks are lost')
+
+
+def wait(pool, result, processes, interval=0.1):
+    """ Value of an AsyncResult of the pool.
+
+    :param processes: workers(pool) before the task was submitted
+    :raises BrokenPoolError: if a worker died meanwhile
+    """
+    while True:
+        try:
+            return result.get(interval)
+        except TimeoutError:
+            check_workers(pool, processes)
+
+
+def pool_map(pool, func, seq, chunksize=None):
+    """ pool.map(func, seq), raising BrokenPoolError instead of blocking. """
+    processes = workers(pool)
+    return wait(pool, pool.map_async(func, seq, chunksize), processes)
+
+
+def pool_starmap(pool, func, args, chunksize=None):
+    """ pool.starmap(func, args), raising BrokenPoolError instead of
+    blocking. """
+    processes = workers(pool)
+    return wait(pool, pool.starmap_async(func, args, chunksize), processes)
+
+
+def pool_apply(pool, func, args=()):
+    """ pool.apply(func, args), raising BrokenPoolError instead of
+    blocking. """
+    processes = workers(pool)
+    return wait(pool, pool.apply_async(func, args), processes)
+
+
+def resize_pool(N):
+    """ Keep only the shared pool of N workers.
+
+    Pools of other sizes are shut down.
+    """
+    N = pool_size(N)
+    with _lock:
+        others = [size for size in _pools if size != N]
+    for size in others:
+        close_pool(size)
+    return get_pool(N)
+
+
+def shutdown_pools():
+    """ Close all shared pools, waiting for workers to finish. """
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _main_snapshots.clear()
+
+    for pool in pools:
+        pool.close()
+        pool.join()
+
+
+atexit.register(shutdown_pools)
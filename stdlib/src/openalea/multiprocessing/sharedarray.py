@@ -0,0 +1,202 @@
+# -*- python -*-
+#
+#       OpenAlea.StdLib
+#
+#       Copyright 2006-2023 INRIA - CIRAD - INRA
+#
+#       Distributed under the Cecill-C License.
+#       See accompanying file LICENSE.txt or copy at
+#           http://www.cecill.info/licences/Licence_CeCILL-C_V1-en.html
+#
+#       OpenAlea WebSite : http://openalea.gforge.inria.fr
+#
+################################################################################
+""" NumPy arrays in shared memory for the parallel nodes.
+
+Arrays are copied once in a `multiprocessing.shared_memory` block and
+workers only receive a small descriptor (name, shape, dtype)
+to build a view on it, instead of pickling the data through pipes.
+"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$ "
+
+from multiprocessing import shared_memory
+
+import numpy
+
+from .pool import get_pool, pool_apply, pool_map, pool_size
+
+
+class SharedArray(object):
+    """ A NumPy array stored in a shared memory block.
+
+    The process that creates it owns the block and frees it with
+    `release` (or at the end of a `with` statement).
+    """
+
+    def __init__(self, shape, dtype):
+        dtype = numpy.dtype(dtype)
+        size = int(numpy.prod(shape)) * dtype.itemsize
+        self._shm = shared_memory.SharedMemory(create=True,
+                                               size=max(size, 1))
+        self.array = numpy.ndarray(shape, dtype, buffer=self._shm.buf)
+
+    @classmethod
+    def from_array(cls, arr):
+        """ Copy an array in a new shared block. """
+        shared = cls(arr.shape, arr.dtype)
+        shared.array[...] = arr
+        return shared
+
+    def descriptor(self):
+        """ Picklable description of the array. """
+        arr = self.array
+        return (self._shm.name, arr.shape, arr.dtype.str)
+
+    def release(self):
+        """ Free the shared block. The array can not be used anymore. """
+        if self._shm is not None:
+            self.array = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+# blocks that could not be closed yet, because views on them
+# were still used (e.g. in the traceback of an exception)
+_unclosed = []
+
+
+def attach(descriptor, readonly=False):
+    """ View on an array described by SharedArray.descriptor.
+
+    Used in workers, the block is mapped until detach is called.
+
+    :returns: the view and the opened block
+    """
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    view = numpy.ndarray(shape, dtype, buffer=shm.buf)
+    if readonly:
+        view.flags.writeable = False
+    return view, shm
+
+
+def detach(shm):
+    """ Unmap a block opened by attach.
+
+    Views on it must not be used anymore. Blocks whose views are
+    still referenced are closed by a later call.
+    """
+    blocks = _unclosed + [shm]
+    del _unclosed[:]
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            _unclosed.append(block)
+
+
+def _apply_items(func, arr, out, start, stop):
+    res = []
+    for i in range(start, stop):
+        r = func(arr[i])
+        if (out is not None and isinstance(r, numpy.ndarray)
+                and r.shape == out.shape[1:]
+                and numpy.can_cast(r.dtype, out.dtype, 'safe')):
+            out[i] = r
+            r = None
+        elif (isinstance(r, numpy.ndarray)
+                and numpy.may_share_memory(r, arr)):
+            # the input block is closed before the result is sent
+            r = r.copy()
+        res.append(r)
+    return res
+
+
+def _shared_apply(func, in_desc, out_desc, start, stop):
+    """ Evaluate func on items start to stop of an array in shared memory.
+
+    Blocks are mapped for this task only.
+
+    :returns: the list of results, None for results written in the
+              output block
+    """
+    arr, in_shm = attach(in_desc, readonly=True)
+    out, out_shm = None, None
+    try:
+        if out_desc is not None:
+            out, out_shm = attach(out_desc)
+        return _apply_items(func, arr, out, start, stop)
+    finally:
+        arr = out = None
+        detach(in_shm)
+        if out_shm is not None:
+            detach(out_shm)
+
+
+def _shared_apply_args(args):
+    return _shared_apply(*args)
+
+
+def shared_map(func, arr, N=None, chunksize=None):
+    """ Parallel map of func over arr[0], arr[1], ... using shared memory.
+
+    The input array is copied once in shared memory and each worker
+    reads its item from there. The first item gives the shape and
+    dtype of results: if it is an array, an output block is allocated
+    and workers write their result in it directly. Results of another
+    shape, or of a dtype that can not be safely cast (e.g. int64 values
+    for an int8 block), are sent back and a list is returned.
+
+    Items are plain ndarray views (attributes of ndarray subclasses
+    such as SpatialImage are not transmitted) and are read-only.
+
+    :param func: picklable function of one array
+    :param arr: array (or array-like) mapped along its first axis
+    :param N: number of workers (all cpus if N < 1)
+    :param chunksize: number of items evaluated by a task, the
+                      input and output blocks are mapped by workers
+                      for one task only
+    :returns: an ndarray if all results are arrays of the same shape
+              as the first one, a list of results otherwise
+    """
+    arr = numpy.ascontiguousarray(arr)
+    n = len(arr)
+    if n == 0:
+        return []
+
+    pool = get_pool(N, (func,))
+    if chunksize is None:
+        chunksize = -(-(n - 1) // (4 * pool_size(N)))
+    ranges = [(i, min(i + max(1, chunksize), n))
+              for i in range(1, n, max(1, chunksize))]
+    with SharedArray.from_array(arr) as src:
+        first, = pool_apply(pool, _shared_apply,
+                            (func, src.descriptor(), None, 0, 1))
+        if not isinstance(first, numpy.ndarray):
+            args = [(func, src.descriptor(), None, start, stop)
+                    for start, stop in ranges]
+            chunks = pool_map(pool, _shared_apply_args, args, 1)
+            return [first] + [r for chunk in chunks for r in chunk]
+
+        with SharedArray((n,) + first.shape, first.dtype) as out:
+            out.array[0] = first
+            args = [(func, src.descriptor(), out.descriptor(), start, stop)
+                    for start, stop in ranges]
+            chunks = pool_map(pool, _shared_apply_args, args, 1)
+            res = [r for chunk in chunks for r in chunk]
+
+            if all(r is None for r in res):
+                return out.array.copy()
+
+            # some results do not fit in the output block
+            return [first] + [out.array[i + 1].copy() if r is None else r
+                              for i, r in enumerate(res)]
@@ -0,0 +1,123 @@
+"""functional node tests"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$"
+
+import operator
+
+from openalea.core.alea import run
+from openalea.core.pkgmanager import PackageManager
+
+""" A unique PackageManager is created for all test of dataflow """
+pm = PackageManager()
+pm.init(verbose=False)
+
+
+def test_map():
+    """ Test of node map """
+    res = run(('openalea.functional', 'map'),
+              inputs={'func': abs, 'seq': [-1, 2, -3]}, pm=pm)
+    assert res[0] == [1, 2, 3]
+
+
+def test_lazy_pipeline():
+    """ imap -> ifilter -> ireduce on a generator """
+    from openalea.functional.functional import pyifilter, pyimap, pyireduce
+    seq = (i for i in range(1000))
+    mapped = pyimap(abs, seq)[0]
+    filtered = pyifilter(lambda x: x % 2, mapped)[0]
+    assert pyireduce(operator.add, filtered)[0] == 250000
+    assert pyireduce(operator.add, iter(()), 0)[0] == 0
+
+
+def test_batched():
+    """ Test of nodes chain and batched """
+    seq = run(('openalea.functional', 'chain'),
+              inputs={'seq1': [1, 2], 'seq2': range(3)}, pm=pm)[0]
+    res = run(('openalea.functional', 'batched'),
+              inputs={'seq': seq, 'n': 2}, pm=pm)
+    assert list(res[0]) == [[1, 2], [0, 1], [2]]
+
+
+def test_map_array():
+    """ Test of node map on a NumPy array """
+    try:
+        import numpy
+    except ImportError:
+        return
+    import math
+    a = numpy.linspace(0, 1, 100)
+    for func in (numpy.sin, lambda x: numpy.sin(x), math.sin):
+        res = run(('openalea.functional', 'map'),
+                  inputs={'func': func, 'seq': a}, pm=pm)
+        assert isinstance(res[0], numpy.ndarray)
+        assert numpy.allclose(res[0], numpy.sin(a))
+
+    # row by row
+    m = numpy.arange(12.).reshape((4, 3))
+    res = run(('openalea.functional', 'map'),
+              inputs={'func': numpy.sum, 'seq': m}, pm=pm)
+    assert list(res[0]) == [3., 12., 21., 30.]
+
+
+def test_map_array_calls():
+    """ func is called once per item, unless vectorize is True """
+    try:
+        import numpy
+    except ImportError:
+        return
+    calls = []
+
+    def double(x):
+        calls.append(x)
+        return 2 * x
+
+    def nothing(x):
+        calls.append(x)
+
+    a = numpy.arange(20.)
+    for func, expected in ((double, 2 * a), (nothing, [None] * 20)):
+        del calls[:]
+        res = run(('openalea.functional', 'map'),
+                  inputs={'func': func, 'seq': a}, pm=pm)
+        assert len(calls) == 20
+        assert list(res[0]) == list(expected)
+
+    del calls[:]
+    res = run(('openalea.functional', 'map'),
+              inputs={'func': double, 'seq': a, 'vectorize': True}, pm=pm)
+    assert len(calls) < 20
+    assert (res[0] == 2 * a).all()
+
+    # numpy scalars needed from the 8th item on, only it is evaluated twice
+    def item(x):
+        calls.append(x)
+        return x.item() if len(calls) >= 8 else x
+
+    del calls[:]
+    res = run(('openalea.functional', 'map'),
+              inputs={'func': item, 'seq': a}, pm=pm)
+    assert len(calls) == 21
+    assert (res[0] == a).all()
+
+
+def test_function():
+    """ Test of node function and of its compiled code cache """
+    import pickle
+    code = "def f(x):\n    return x + 1\n"
+    res = run(('openalea.functional', 'function'),
+              inputs={'code': code}, pm=pm)
+    func = res[0]
+    assert func(1) == 2
+    assert run(('openalea.functional', 'function'),
+               inputs={'code': code}, pm=pm)[0] is func
+    assert pickle.loads(pickle.dumps(func))(2) == 3
+
+    # the signature and docstring of the function are kept
+    import inspect
+    code = "def g(x, y=2):\n    \"\"\" doc of g \"\"\"\n    return x + y\n"
+    func = run(('openalea.functional', 'function'),
+               inputs={'code': code}, pm=pm)[0]
+    assert str(inspect.signature(func)) == '(x, y=2)'
+    assert func.__doc__ == ' doc of g '
+    assert func.__wrapped__(1) == 3
@@ -0,0 +1,288 @@
+"""multiprocessing node tests"""
+
+__license__ = "Cecill-C"
+__revision__ = " $Id$"
+
+import os
+import sys
+from threading import Thread
+
+import pytest
+
+from openalea.core.alea import run
+from openalea.core.pkgmanager import PackageManager
+from openalea.multiprocessing import pool
+
+""" A unique PackageManager is created for all test of dataflow """
+pm = PackageManager()
+pm.init(verbose=False)
+
+
+def test_pmap():
+    """ Test of node pmap """
+    res = run(('openalea.multiprocessing', 'pmap'),
+              inputs={'func': abs, 'seq': [-1, 2, -3], 'N': 2}, pm=pm)
+    assert res[0] == [1, 2, 3]
+
+
+def test_pmap_iterables(tmpdir):
+    """ Test of node pmap without sequence or on a generator """
+    from openalea.multiprocessing import cache
+    os.environ[cache.CACHE_DIR_VARIABLE] = str(tmpdir)
+    try:
+        for use_cache in (False, True):
+            for seq, expected in ((None, []), ([], []),
+                                  ((-i for i in range(3)), [0, 1, 2])):
+                res = run(('openalea.multiprocessing', 'pmap'),
+                          inputs={'func': abs, 'seq': seq, 'N': 2,
+                                  'cache': use_cache}, pm=pm)
+                assert res[0] == expected
+    finally:
+        del os.environ[cache.CACHE_DIR_VARIABLE]
+
+
+def test_pool_reuse():
+    """ The pool is shared between evaluations """
+    p = pool.get_pool(2)
+    run(('openalea.multiprocessing', 'pmap'),
+        inputs={'func': abs, 'seq': [-1, 2], 'N': 2}, pm=pm)
+    assert pool.get_pool(2) is p
+    pool.close_pool(2)
+    assert pool.get_pool(2) is not p
+
+
+def _times_ten(x):
+    return 10 * x
+
+
+def _exit_worker(x):
+    os._exit(1)
+
+
+def test_pool_late_main_function():
+    """ Functions defined in __main__ after the workers were created """
+    pool.get_pool(2)
+    run(('openalea.multiprocessing', 'pmap'),
+        inputs={'func': abs, 'seq': [-1, 2], 'N': 2}, pm=pm)
+
+    # as if defined later in an interactive session
+    main = sys.modules['__main__']
+    _times_ten.__module__ = '__main__'
+    _times_ten.__qualname__ = '_late_times_ten'
+    main._late_times_ten = _times_ten
+    res = []
+    try:
+        t = Thread(target=lambda: res.append(run(
+            ('openalea.multiprocessing', 'pmap'),
+            inputs={'func': _times_ten, 'seq': [1, 2], 'N': 2}, pm=pm)))
+        t.daemon = True
+        t.start()
+        t.join(60)
+    finally:
+        del main._late_times_ten
+    assert res and res[0][0] == [10, 20]
+
+
+def test_broken_pool():
+    """ A dead worker raises an error instead of blocking the map """
+    p = pool.get_pool(2)
+    with pytest.raises(pool.BrokenPoolError):
+        pool.pool_map(p, _exit_worker, [1, 2])
+    assert pool.get_pool(2) is not p
+    res = run(('openalea.multiprocessing', 'pmap'),
+              inputs={'func': abs, 'seq': [-1, 2], 'N': 2}, pm=pm)
+    assert res[0] == [1, 2]
+
+
+def test_pimap():
+    """ Test of node pimap on a generator """
+    res = run(('openalea.multiprocessing', 'pimap'),
+              inputs={'func': abs, 'seq': (-i for i in range(1000)),
+                      'N': 2, 'chunksize': 0, 'ordered': True}, pm=pm)
+    assert list(res[0]) == list(range(1000))
+
+
+def test_pmap_shared_memory():
+    """ Test of node pmap with arrays in shared memory """
+    try:
+        import numpy
+    except ImportError:
+        return
+    a = numpy.arange(24.).reshape((4, 2, 3))
+    res = run(('openalea.multiprocessing', 'pmap'),
+              inputs={'func': numpy.negative, 'seq': a, 'N': 2,
+                      'shared_memory': True}, pm=pm)
+    assert isinstance(res[0], numpy.ndarray)
+    assert (res[0] == -a).all()
+
+
+def _int8_first(x):
+    import numpy
+    return (x * 1000).astype(numpy.int8 if x[0] == 0 else numpy.int64)
+
+
+def test_shared_memory_dtypes():
+    """ Results that do not fit the output block are not truncated """
+    try:
+        import numpy
+    except ImportError:
+        return
+    a = numpy.arange(3).reshape((3, 1))
+    res = run(('openalea.multiprocessing', 'pmap'),
+              inputs={'func': _int8_first, 'seq': a, 'N': 2,
+                      'shared_memory': True}, pm=pm)
+    assert [int(r[0]) for r in res[0]] == [0, 1000, 2000]
+
+
+def _nb_shared_blocks(_):
+    with open('/proc/self/maps') as f:
+        return sum('psm_' in line for line in f)
+
+
+def test_shared_memory_released():
+    """ Workers do not keep shared blocks mapped after a map """
+    try:
+        import numpy
+    except ImportError:
+        return
+    if not os.path.exists('/proc/self/maps'):
+        return
+    a = numpy.arange(24.).reshape((4, 2, 3))
+    for func in (numpy.negative, numpy.sum):
+        run(('openalea.multiprocessing', 'pmap'),
+            inputs={'func': func, 'seq': a, 'N': 2,
+                    'shared_memory': True}, pm=pm)
+    p = pool.get_pool(2)
+    assert pool.pool_map(p, _nb_shared_blocks, range(4), 1) == [0] * 4
+
+
+def test_pfilter():
+    """ Test of node pfilter """
+    res = run(('openalea.multiprocessing', 'pfilter'),
+              inputs={'func': abs, 'seq': [0, 1, 0, -2, 3], 'N': 2,
+                      'chunksize': 2}, pm=pm)
+    assert res[0] == [1, -2, 3]
+
+
+def test_preduce():
+    """ Test of node preduce """
+    import operator
+    res = run(('openalea.multiprocessing', 'preduce'),
+              inputs={'func': operator.add,
+                      'seq': [[i] for i in range(100)], 'N': 2,
+                      'initial': [-1]}, pm=pm)
+    assert res[0] == list(range(-1, 100))
+
+
+def test_pmap_cache(tmpdir):
+    """ Test of node pmap with the result cache """
+    import os
+    from openalea.multiprocessing import cache
+    os.environ[cache.CACHE_DIR_VARIABLE] = str(tmpdir)
+    try:
+        for i in range(2):
+            res = run(('openalea.multiprocessing', 'pmap'),
+                      inputs={'func': abs, 'seq': [-1, 2, -3], 'N': 2,
+                              'cache': True}, pm=pm)
+            assert res[0] == [1, 2, 3]
+        assert cache.get_cache().size() > 0
+    finally:
+        del os.environ[cache.CACHE_DIR_VARIABLE]
+
+
+_factor = 2
+
+
+def _scale(x, k=2):
+    return x * k
+
+
+def _scaled(x):
+    return _scale(x, _factor)
+
+
+def test_function_hash():
+    """ The hash changes with default arguments and referenced globals """
+    from openalea.multiprocessing.cache import function_hash
+    h = function_hash(_scale)
+    defaults = _scale.__defaults__
+    _scale.__defaults__ = (10,)
+    try:
+        assert function_hash(_scale) != h
+    finally:
+        _scale.__defaults__ = defaults
+    assert function_hash(_scale) == h
+
+    global _factor
+    h = function_hash(_scaled)
+    _factor = 3
+    try:
+        assert function_hash(_scaled) != h
+    finally:
+        _factor = 2
+
+
+def test_cache_eviction(tmpdir):
+    """ Least recently used results are evicted above max_size """
+    from openalea.multiprocessing.cache import ResultCache
+    c = ResultCache(str(tmpdir), max_size=100)
+    res = c.map(lambda f, items: [f(x) for x in items], str, list(range(100)))
+    assert res == [str(x) for x in range(100)]
+    assert c.size() <= 100
+    assert 0 < len(c._files()) < 100
+
+
+def test_pmap_instrumented():
+    """ Test of node pmap instrumented with a failing item """
+    from openalea.multiprocessing.parallel import ItemError
+    progress = []
+    res = run(('openalea.multiprocessing', 'pmap instrumented'),
+              inputs={'func': abs, 'seq': [-1, 'a', -3], 'N': 2,
+                      'errors': 'return', 'retries': 1,
+                      'progress': lambda nb, total: progress.append(nb)},
+              pm=pm)
+    assert res[0][0] == 1 and res[0][2] == 3
+    assert isinstance(res[0][1], ItemError)
+    assert res[0][1].index == 1 and res[0][1].attempts == 2
+    assert len(res[1]) == 3
+    assert progress == [1, 2, 3]
+
+
+def _exit_on_first_attempt(path):
+    """ Crash the worker the first time path is given. """
+    if not os.path.exists(path):
+        open(path, 'w').close()
+        os._exit(1)
+    return path
+
+
+def test_pmap_instrumented_crash(tmpdir):
+    """ Items whose worker crashed are retried in a new pool """
+    from openalea.multiprocessing.parallel import ItemError
+    path = str(tmpdir.join('crashed'))
+    res = run(('openalea.multiprocessing', 'pmap instrumented'),
+              inputs={'func': _exit_on_first_attempt, 'seq': [path],
+                      'N': 2, 'errors': 'return', 'retries': 1,
+                      'timeout': 0}, pm=pm)
+    assert res[0] == [path]
+
+    res = run(('openalea.multiprocessing', 'pmap instrumented'),
+              inputs={'func': _exit_worker, 'seq': [1], 'N': 2,
+                      'errors': 'return', 'retries': 1,
+                      'timeout': 0}, pm=pm)
+    assert isinstance(res[0][0], ItemError)
+    assert res[0][0].attempts == 2
+
+
+def test_parallel_ipython_backend():
+    """ pmap of parallelIPython runs on the default backend """
+    from openalea.multiprocessing import executor
+    from openalea.multiprocessing.parallelIPython import pmap
+    os.environ[executor.DEFAULT_BACKEND_VARIABLE] = 'process'
+    try:
+        assert pmap(abs, [-1, 2], N=2)[0] == [1, 2]
+    finally:
+        del os.environ[executor.DEFAULT_BACKEND_VARIABLE]
+    assert pmap(abs, [-3], backend='thread')[0] == [3]
+    with pytest.raises(TypeError):
+        executor.Executor()
@@ -20,3 +20,147 @@ def test_read_csv_from_file():
 
 
 test_read_csv_from_file()
+
+
+def test_read_csv_columnar():
+    """ Test of node read_csv returning a Table """
+    text = 'a,"b",c\n1,2.5,x\n2,,y\n3,4,'
+    objs, header = run(('openalea.csv', 'read csv'),
+                       inputs={'text': text, 'columnar': False}, pm=pm)
+    table, header = run(('openalea.csv', 'read csv'),
+                        inputs={'text': text, 'columnar': True}, pm=pm)
+    assert len(table) == len(objs) == 3
+    for obj, row in zip(objs, table):
+        assert obj.__dict__ == row.as_dict()
+        assert ([type(v) for v in obj.__dict__.values()] ==
+                [type(v) for v in row.as_dict().values()])
+        assert obj['a'] == row['a'] == row.a
+        assert hasattr(obj, 'b') == hasattr(row, 'b')
+    assert list(table['a']) == [1, 2, 3]
+    assert table['c'] == ['x', 'y', None]
+
+
+def test_table_rows():
+    """ Rows of a Table can be copied and pickled """
+    import copy
+    import pickle
+    from openalea.csv.table import Table
+    lines = ['1,x', '2.5,y', '3,z']
+    table = Table.from_lines(['a', 'b'], lines, chunksize=2)
+    assert [row.a for row in table] == [1, 2.5, 3]
+    assert type(table[0].a) is int
+    for row in (copy.copy(table[0]), copy.deepcopy(table[0]),
+                pickle.loads(pickle.dumps(table[0]))):
+        assert row.as_dict() == {'pid': 1, 'a': 1, 'b': 'x'}
+
+
+def test_write_csv_file(tmpdir):
+    """ Test of node write csv file against write csv """
+    objs, header = run(('openalea.csv', 'read csv'),
+                       inputs={'text': 'a,b\n1,x\n2,\n'}, pm=pm)
+    text = run(('openalea.csv', 'write csv'),
+               inputs={'objects': objs}, pm=pm)[0]
+    filename = str(tmpdir.join('out.csv'))
+    run(('openalea.csv', 'write csv file'),
+        inputs={'objects': objs, 'filename': filename}, pm=pm)
+    with open(filename, newline='') as f:
+        assert f.read() == text
+
+    run(('openalea.csv', 'write csv file'),
+        inputs={'objects': iter(objs), 'filename': filename,
+                'header': ['a', 'b']}, pm=pm)
+    with open(filename, newline='') as f:
+        assert f.read() == '"a","b"\n1,"x"\n2,\n'
+
+
+def test_read_csv_chunks(tmpdir):
+    """ Parsing by chunks in a pool gives the same values """
+    from openalea.csv.csv import iter_csv_chunks, read_csv_from_file
+    filename = str(tmpdir.join('data.csv'))
+    with open(filename, 'w') as f:
+        f.write('id,x,name\n')
+        for i in range(1000):
+            f.write('%d,%s,n%d\n' % (i, i / 4., i))
+
+    for header in (False, True):
+        ref = read_csv_from_file(filename, ',', header)[1]
+        res = read_csv_from_file(filename, ',', header, N=2,
+                                 chunk_size=1000)[1]
+        assert res == ref
+
+    res = read_csv_from_file(filename, ',', True, typed=True, N=2,
+                             chunk_size=1000)[1]
+    assert res['id'].dtype.kind == 'i' and list(res['id']) == list(range(1000))
+    assert res['x'][3] == 0.75 and res['name'][3] == 'n3'
+
+    chunks = list(iter_csv_chunks(filename, ',', True, chunk_size=1000))
+    assert len(chunks) > 1
+    assert sum(len(c['id']) for c in chunks) == 1000
+
+
+def test_read_csv_chunk_types(tmpdir):
+    """ The type of a column does not depend on the chunk size """
+    from openalea.csv.csv import read_csv_from_file
+    filename = str(tmpdir.join('data.csv'))
+    with open(filename, 'w') as f:
+        f.write('id,code,x\n')
+        for i in range(100):
+            f.write('%d,007,%d\n' % (i, i))
+        for i in range(100):
+            f.write('%d,A7,%s\n' % (i, i + 0.5))
+
+    ref = read_csv_from_file(filename, ',', True, typed=True,
+                             chunk_size=1 << 20)[1]
+    for N in (1, 2):
+        res = read_csv_from_file(filename, ',', True, typed=True, N=N,
+                                 chunk_size=256)[1]
+        for name in ('id', 'code', 'x'):
+            assert res[name].dtype == ref[name].dtype
+            assert list(res[name]) == list(ref[name])
+    assert ref['code'][0] == '007' and ref['code'][-1] == 'A7'
+
+
+def test_read_csv_cache(tmpdir):
+    """ Typed columns are memory mapped from the sidecar cache """
+    import os
+    from openalea.csv import sidecar
+    from openalea.csv.csv import read_csv_from_file
+    filename = str(tmpdir.join('data.csv'))
+    with open(filename, 'w') as f:
+        f.write('id,x\n1,0.5\n2,1.5\n')
+
+    ref = read_csv_from_file(filename, ',', True, cache=True)[1]
+    assert os.path.isdir(sidecar.sidecar_path(filename))
+    res = read_csv_from_file(filename, ',', True, cache=True)[1]
+    assert list(res) == ['id', 'x']
+    assert list(res['id']) == list(ref['id']) == [1, 2]
+    assert not res['x'].flags.writeable
+
+    # the cache is rebuilt when the file changes
+    with open(filename, 'a') as f:
+        f.write('3,2.5\n')
+    res = read_csv_from_file(filename, ',', True, cache=True)[1]
+    assert list(res['id']) == [1, 2, 3]
+
+
+def test_read_rows(tmpdir):
+    """ Test of node read rows """
+    import os
+    from openalea.csv.rowindex import index_path
+    filename = str(tmpdir.join('data.csv'))
+    with open(filename, 'w') as f:
+        f.write('id,name\n')
+        for i in range(100):
+            f.write('%d,n%d\n' % (i, i))
+
+    rows, header = run(('openalea.csv', 'read rows'),
+                       inputs={'filename': filename, 'start': 42, 'stop': 45,
+                               'header': True, 'step': 10}, pm=pm)
+    assert header == ['id', 'name']
+    assert rows == [['42', 'n42'], ['43', 'n43'], ['44', 'n44']]
+    assert os.path.exists(index_path(filename))
+
+    rows, header = run(('openalea.csv', 'read rows'),
+                       inputs={'filename': filename, 'start': -2,
+                               'header': True, 'step': 10}, pm=pm)
+    assert rows == [['98', 'n98'], ['99', 'n99']]